@@ -5,17 +5,29 @@ import csv
 import io
 import base64
 import binascii
-import json
 import logging
 import secrets
+import threading
+import time
+from calendar import monthrange
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, date, timedelta
-from contextlib import closing
-from typing import Any, Dict, Optional, Tuple, List
+from contextlib import closing, contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple, List
 
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
 
-from flask import Flask, jsonify, request, make_response, g
-from functools import wraps
+try:
+    import fcntl
+except ImportError:  # Windows: brak blokad plikowych, wystarcza blokada wątkowa
+    fcntl = None
+
+from flask import Flask, jsonify, request, g, has_app_context, send_file, stream_with_context
+from functools import lru_cache, wraps
+from flask.json.provider import JSONProvider
 from flask_cors import CORS
 import bcrypt
 
@@ -26,17 +38,248 @@ if not logging.getLogger().handlers:
 
 logger = logging.getLogger(__name__)
 
+
+ORJSON_OPTIONS = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+
+
+class OrjsonProvider(JSONProvider):
+    """Dostawca JSON dla Flaska oparty na orjson, zachowujący sortowanie kluczy jak domyślny."""
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        """Serializuje obiekt do tekstu JSON."""
+        return orjson.dumps(obj, option=ORJSON_OPTIONS).decode('utf-8')
+
+    def loads(self, s: Any, **kwargs: Any) -> Any:
+        """Odczytuje obiekt z tekstu lub bajtów JSON."""
+        return orjson.loads(s)
+
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 CORS(app)
 app.secret_key = os.environ.get('SAVOO_SECRET_KEY', 'savoo_super_secret_key')
 
+
+def _json(obj: Any, status: int = 200):
+    """Serializuje odpowiedź prosto do bajtów, pomijając warstwę jsonify na gorących endpointach odczytu."""
+    return app.response_class(orjson.dumps(obj, option=ORJSON_OPTIONS), status=status, mimetype='application/json')
+
+
 EMAIL_REGEX = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
 PASSWORD_REGEX = re.compile(r"^(?=.*[A-Za-z])(?=.*\d).{6,}$")
+SLUG_REGEX = re.compile(r'[^a-z0-9]+')
+ISO_DATE_REGEX = re.compile(r'\d{4}-\d{2}-\d{2}')
 NBP_API_URL = 'https://api.nbp.pl/api/exchangerates/tables/A?format=json'
 BUDGET_ALERT_THRESHOLD = 0.9
+CATEGORY_TYPES = frozenset(('income', 'expense'))
+TRANSACTION_TYPES = frozenset(('income', 'expense', 'transfer'))
+RECURRENCE_FREQUENCIES = frozenset(('daily', 'weekly', 'monthly', 'quarterly', 'yearly'))
+BUDGET_PERIODS = frozenset(('weekly', 'monthly', 'quarterly', 'custom'))
 BASE_CURRENCY = 'PLN'
 CURRENCY_CACHE_PATH = os.path.join(os.path.dirname(__file__), 'currency_rates_cache.json')
+CURRENCY_CACHE_LOCK_PATH = CURRENCY_CACHE_PATH + '.lock'
 CURRENCY_CACHE_TTL = timedelta(hours=24)
+RECURRENCE_FETCH_BATCH = 256
+EXPORT_FETCH_BATCH = 1000
+CSV_STREAM_CHUNK_SIZE = 64 * 1024
+EXPORT_JOBS_DIR = os.path.join(os.path.dirname(__file__), 'exports')
+EXPORT_JOB_TTL = timedelta(hours=1)
+CURRENCIES_RESPONSE_TTL_SECONDS = 3600.0
+SEED_WAIT_TIMEOUT_SECONDS = 5.0
+SQLITE_SUPPORTS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+SQLITE_CACHED_STATEMENTS = 256
+SQLITE_CONNECTION_PRAGMAS = (
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA wal_autocheckpoint=1000',
+    'PRAGMA busy_timeout=5000',
+    'PRAGMA cache_size=-65536',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA mmap_size=268435456',
+)
+_WAL_ENABLED = False
+
+SQL_GET_USER_BY_EMAIL = 'SELECT * FROM users WHERE email = ?'
+SQL_GET_USER_ID_BY_EMAIL = 'SELECT id FROM users WHERE email = ?'
+SQL_GET_USER_AUTH_ROW = 'SELECT id, email, role, password_hash FROM users WHERE email = ?'
+SQL_GET_USER_BY_ID = 'SELECT * FROM users WHERE id = ?'
+SQL_GET_USER_CURRENCY = 'SELECT default_currency FROM users WHERE id = ?'
+SQL_UPDATE_LAST_LOGIN = 'UPDATE users SET last_login_at = ?, updated_at = ? WHERE id = ?'
+SQL_UPDATE_PASSWORD_HASH = 'UPDATE users SET password_hash = ? WHERE id = ?'
+SQL_GET_OWNED_CATEGORY_ID = 'SELECT id FROM categories WHERE id = ? AND user_id = ?'
+SQL_GET_OWNED_SAVINGS_GOAL_ID = 'SELECT id FROM savings_goals WHERE id = ? AND user_id = ?'
+SQL_GET_TRANSACTION_EDIT_STATE = (
+    'SELECT t.type, t.category_id, t.amount, t.currency, t.budget_id, u.default_currency, '
+    '(SELECT 1 FROM categories WHERE id = ? AND user_id = t.user_id) AS category_owned, '
+    '(SELECT 1 FROM budgets WHERE id = ? AND user_id = t.user_id) AS budget_owned '
+    'FROM transactions t LEFT JOIN users u ON u.id = t.user_id WHERE t.id = ? AND t.user_id = ?'
+)
+SQL_GET_RECURRING_EDIT_STATE = 'SELECT type, category_id FROM recurring_transactions WHERE id = ? AND user_id = ?'
+SQL_INSERT_CATEGORY = 'INSERT INTO categories (user_id, name, type, color, icon_url) VALUES (?, ?, ?, ?, ?)'
+SQL_INSERT_RECURRING_OCCURRENCE = 'INSERT INTO transactions (user_id, category_id, type, amount, currency, converted_amount, note, occurred_on) VALUES (?, ?, ?, ?, ?, ?, ?, ?)'
+SQL_DUE_RECURRENCES_WHERE = 'user_id = ? AND next_occurrence <= ? AND (end_date IS NULL OR next_occurrence <= end_date)'
+SQL_HAS_DUE_RECURRENCES = f'SELECT 1 FROM recurring_transactions WHERE {SQL_DUE_RECURRENCES_WHERE} LIMIT 1'
+SQL_LIST_DUE_RECURRENCES = f'SELECT * FROM recurring_transactions WHERE {SQL_DUE_RECURRENCES_WHERE}'
+SQL_UPDATE_RECURRENCE_SCHEDULE = 'UPDATE recurring_transactions SET next_occurrence = ?, last_generated = ? WHERE id = ?'
+SQL_UPDATE_BUDGET_NOTIFIED = 'UPDATE budgets SET last_notified_at = ? WHERE id = ?'
+SQL_INSERT_RECURRING_TRANSACTION = (
+    'INSERT INTO recurring_transactions (user_id, category_id, type, amount, currency, note, frequency, start_date, next_occurrence, end_date) '
+    'SELECT ?, ?, ?, ?, ?, ?, ?, ?, ?, ? '
+    'WHERE ? IS NULL OR EXISTS (SELECT 1 FROM categories WHERE id = ? AND user_id = ?)'
+)
+SQL_INSERT_TRANSACTION = (
+    'INSERT INTO transactions (user_id, category_id, type, amount, currency, converted_amount, note, kind, budget_id, occurred_on) '
+    'SELECT ?, ?, ?, ?, ?, ?, ?, ?, ?, ? '
+    'WHERE (? IS NULL OR EXISTS (SELECT 1 FROM categories WHERE id = ? AND user_id = ?)) '
+    'AND (? IS NULL OR EXISTS (SELECT 1 FROM budgets WHERE id = ? AND user_id = ?))'
+)
+
+CATEGORY_FIELDS = ('id', 'user_id', 'name', 'type', 'color', 'icon_url', 'created_at')
+BUDGET_TYPE_FIELDS = ('id', 'user_id', 'name', 'created_at')
+RECURRING_TRANSACTION_FIELDS = (
+    'id', 'user_id', 'category_id', 'type', 'amount', 'currency', 'note', 'frequency',
+    'start_date', 'next_occurrence', 'end_date', 'last_generated', 'created_at',
+)
+TRANSACTION_FIELDS = (
+    'id', 'user_id', 'category_id', 'type', 'amount', 'currency', 'converted_amount', 'note', 'kind',
+    'budget_id', 'occurred_on', 'created_at', 'updated_at',
+)
+TRANSACTION_LIST_FIELDS = TRANSACTION_FIELDS + ('budget_name', 'budget_type')
+BUDGET_FIELDS = (
+    'id', 'user_id', 'category_id', 'name', 'limit_amount', 'period', 'budget_type', 'start_date', 'end_date',
+    'created_at', 'last_notified_at',
+)
+SQL_LIST_CATEGORIES = f"SELECT {', '.join(CATEGORY_FIELDS)} FROM categories WHERE user_id = ? ORDER BY type DESC, created_at DESC"
+SQL_LIST_BUDGET_TYPES = f"SELECT {', '.join(BUDGET_TYPE_FIELDS)} FROM budget_types WHERE user_id = ? ORDER BY created_at DESC"
+SQL_LIST_RECURRING_TRANSACTIONS = (
+    f"SELECT {', '.join(RECURRING_TRANSACTION_FIELDS)} FROM recurring_transactions WHERE user_id = ? ORDER BY created_at DESC"
+)
+SQL_BUDGET_SPENDING = (
+    'WITH b AS ('
+    '    SELECT id, category_id, COALESCE(date(start_date), ?) AS period_start, COALESCE(date(end_date), ?) AS period_end'
+    '    FROM budgets WHERE user_id = ?'
+    '), t AS ('
+    '    SELECT budget_id, category_id, amount, currency, date(substr(occurred_on, 1, 10)) AS occurred_day'
+    '    FROM transactions WHERE user_id = ? AND type = ?'
+    '    AND occurred_on >= (SELECT MIN(period_start) FROM b)'
+    "    AND occurred_on < (SELECT date(MAX(period_end), '+1 day') FROM b)"
+    ') '
+    'SELECT b.id AS budget_id, t.currency, '
+    'TOTAL(CASE WHEN t.budget_id = b.id THEN t.amount END) AS direct_amount, '
+    'COUNT(CASE WHEN t.budget_id = b.id THEN 1 END) AS direct_count, '
+    'TOTAL(CASE WHEN t.budget_id IS NULL THEN t.amount END) AS fallback_amount, '
+    'COUNT(CASE WHEN t.budget_id IS NULL THEN 1 END) AS fallback_count '
+    'FROM b JOIN t ON t.occurred_day BETWEEN b.period_start AND b.period_end '
+    'AND (t.budget_id = b.id OR (b.category_id AND t.budget_id IS NULL AND t.category_id = b.category_id)) '
+    'GROUP BY b.id, t.currency'
+)
+SQL_LIST_TRANSACTIONS = (
+    f"SELECT {', '.join(f't.{field}' for field in TRANSACTION_FIELDS)}, b.name AS budget_name, b.budget_type AS budget_type "
+    'FROM transactions t LEFT JOIN budgets b ON t.budget_id = b.id WHERE t.user_id = ?'
+)
+SQL_LIST_BUDGETS = f"SELECT {', '.join(BUDGET_FIELDS)} FROM budgets WHERE user_id = ? ORDER BY created_at DESC"
+SQL_DASHBOARD_SOURCE = (
+    '(SELECT type, category_id, total AS amount FROM transaction_monthly_agg '
+    'WHERE user_id = ? AND ym BETWEEN ? AND ? '
+    'UNION ALL '
+    'SELECT type, category_id, COALESCE(converted_amount, amount) AS amount FROM transactions '
+    'WHERE user_id = ? AND occurred_on BETWEEN ? AND ? AND (occurred_on < ? OR occurred_on >= ?)) x'
+)
+SQL_DASHBOARD_TOTALS = (
+    "SELECT COALESCE(SUM(CASE WHEN x.type = 'income' THEN x.amount END), 0) AS total_income, "
+    "COALESCE(SUM(CASE WHEN x.type = 'expense' THEN x.amount END), 0) AS total_expense "
+    f"FROM {SQL_DASHBOARD_SOURCE} WHERE x.type IN ('income', 'expense')"
+)
+SQL_DASHBOARD_TOP_CATEGORIES = (
+    'SELECT c.name, COALESCE(SUM(x.amount), 0) AS spent '
+    f'FROM {SQL_DASHBOARD_SOURCE} LEFT JOIN categories c ON x.category_id = c.id '
+    'WHERE x.type = ? GROUP BY c.name ORDER BY spent DESC LIMIT 5'
+)
+SQL_INSERT_SAVINGS_GOAL = (
+    'INSERT INTO savings_goals (user_id, name, target_amount, current_amount, deadline, category_id, is_active) '
+    'VALUES (?, ?, ?, ?, ?, ?, ?)'
+)
+SQL_DELETE_SAVINGS_GOAL = 'DELETE FROM savings_goals WHERE id = ? AND user_id = ?'
+SQL_INSERT_SAVINGS_CONTRIBUTION = 'INSERT INTO savings_goal_contributions (goal_id, amount, note) VALUES (?, ?, ?)'
+SQL_EXPORT_CATEGORIES = 'SELECT * FROM categories WHERE user_id = ? ORDER BY created_at ASC'
+SQL_EXPORT_BUDGET_TYPES = 'SELECT * FROM budget_types WHERE user_id = ? ORDER BY created_at ASC'
+SQL_EXPORT_BUDGETS = 'SELECT * FROM budgets WHERE user_id = ? ORDER BY created_at ASC'
+SQL_EXPORT_SAVINGS_GOALS = 'SELECT * FROM savings_goals WHERE user_id = ? ORDER BY created_at ASC'
+SQL_EXPORT_SAVINGS_CONTRIBUTIONS = (
+    'SELECT * FROM savings_goal_contributions WHERE goal_id IN '
+    '(SELECT id FROM savings_goals WHERE user_id = ?) ORDER BY created_at ASC'
+)
+SQL_EXPORT_RECURRING_TRANSACTIONS = 'SELECT * FROM recurring_transactions WHERE user_id = ? ORDER BY created_at ASC'
+SQL_EXPORT_TRANSACTIONS = (
+    "SELECT t.id, t.occurred_on, t.type, t.amount, COALESCE(NULLIF(t.currency, ''), ?), t.converted_amount, "
+    "COALESCE(t.category_id, ''), COALESCE(c.name, ''), COALESCE(t.budget_id, ''), COALESCE(b.name, ''), "
+    "COALESCE(t.note, ''), COALESCE(t.kind, ''), t.created_at "
+    'FROM transactions t '
+    'LEFT JOIN categories c ON t.category_id = c.id '
+    'LEFT JOIN budgets b ON t.budget_id = b.id '
+    'WHERE t.user_id = ? '
+    'ORDER BY t.occurred_on ASC, t.created_at ASC, t.id ASC'
+)
+SQL_INSERT_EXPORT_JOB = "INSERT INTO export_jobs (id, user_id, status) VALUES (?, ?, 'pending')"
+SQL_GET_EXPORT_JOB = 'SELECT status, file_path, expires_at, created_at FROM export_jobs WHERE id = ? AND user_id = ?'
+SQL_UPDATE_EXPORT_JOB = 'UPDATE export_jobs SET status = ?, file_path = ?, expires_at = ? WHERE id = ?'
+SQL_LIST_EXPIRED_EXPORT_JOBS = (
+    'SELECT id FROM export_jobs WHERE user_id = ? '
+    'AND (expires_at < ? OR (expires_at IS NULL AND created_at < ?))'
+)
+SQL_DELETE_EXPORT_JOB = 'DELETE FROM export_jobs WHERE id = ?'
+SQL_TRANSACTION_CURRENCY_CODE = (
+    "UPPER(COALESCE(NULLIF(TRIM(transactions.currency), ''), "
+    "(SELECT u.default_currency FROM users u WHERE u.id = transactions.user_id), 'PLN'))"
+)
+SQL_LIST_SAVINGS_GOALS = (
+    'SELECT g.*, COALESCE(SUM(c.amount), 0) AS contributed_total '
+    'FROM savings_goals g LEFT JOIN savings_goal_contributions c ON c.goal_id = g.id '
+    'WHERE g.user_id = ? GROUP BY g.id ORDER BY g.created_at DESC'
+)
+
+
+def _build_masked_updates(table: str, columns: Tuple[str, ...], where: str, extra_sets: Tuple[str, ...] = ()) -> Dict[int, str]:
+    """Przygotowuje instrukcje UPDATE dla każdego niepustego podzbioru kolumn, indeksowane maską bitową."""
+    return {
+        mask: f"UPDATE {table} SET {', '.join([f'{column} = ?' for bit, column in enumerate(columns) if mask >> bit & 1] + list(extra_sets))} WHERE {where}"
+        for mask in range(1, 1 << len(columns))
+    }
+
+
+CATEGORY_UPDATE_COLUMNS = ('name', 'type', 'color', 'icon_url')
+SQL_UPDATE_CATEGORY = _build_masked_updates('categories', CATEGORY_UPDATE_COLUMNS, 'id = ? AND user_id = ?')
+RECURRING_UPDATE_COLUMNS = (
+    'category_id', 'type', 'amount', 'currency', 'note', 'frequency', 'start_date', 'next_occurrence', 'end_date',
+)
+SQL_UPDATE_RECURRING_TRANSACTION = _build_masked_updates(
+    'recurring_transactions', RECURRING_UPDATE_COLUMNS, 'id = ? AND user_id = ?'
+)
+TRANSACTION_UPDATE_COLUMNS = (
+    'category_id', 'budget_id', 'type', 'kind', 'amount', 'currency', 'converted_amount', 'note', 'occurred_on',
+)
+SQL_UPDATE_TRANSACTION = _build_masked_updates(
+    'transactions', TRANSACTION_UPDATE_COLUMNS, 'id = ? AND user_id = ?', ('updated_at = CURRENT_TIMESTAMP',)
+)
+SAVINGS_GOAL_UPDATE_COLUMNS = ('name', 'target_amount', 'current_amount', 'deadline', 'category_id', 'is_active')
+SQL_UPDATE_SAVINGS_GOAL = _build_masked_updates(
+    'savings_goals', SAVINGS_GOAL_UPDATE_COLUMNS, 'id = ? AND user_id = ?', ('updated_at = CURRENT_TIMESTAMP',)
+)
+
+_RATES_CACHE: Optional[Dict[str, float]] = None
+_RATES_CACHE_LOADED_AT: Optional[datetime] = None
+_RATES_CACHE_LOCK = threading.Lock()
+_RATES_REFRESH_LOCK = threading.Lock()
+_RATES_REFRESH_THREAD: Optional[threading.Thread] = None
+_CURRENCY_CACHE_MEM: Optional[Dict[str, Any]] = None
+_CURRENCIES_CACHE: Dict[str, Any] = {'body': None, 'expires_at': 0.0}
+_SEED_EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix='savoo-seed')
+_SEEDING_EVENTS: Dict[int, threading.Event] = {}
+_SEEDING_LOCK = threading.Lock()
+_NOTIFY_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix='savoo-notify')
+_EXPORT_JOB_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix='savoo-export-job')
+
+_NBP_SESSION = requests.Session()
+_NBP_SESSION.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=4, max_retries=1))
 
 SECURITY_QUESTION_CHOICES = {
     'pet_name': 'Imię Twojego pupila',
@@ -46,78 +289,34 @@ SECURITY_QUESTION_CHOICES = {
     'first_school': 'Nazwa Twojej pierwszej szkoły',
 }
 RESET_TOKEN_TTL = timedelta(minutes=15)
+BCRYPT_COST = int(os.environ.get('BCRYPT_COST', '10'))
+BCRYPT_HASH_PREFIXES = ('$2a$', '$2b$', '$2y$')
 
 
 def end_of_month(value: date) -> date:
     """Zwraca ostatni dzień miesiąca dla podanej daty."""
-    next_month = (value.replace(day=28) + timedelta(days=4)).replace(day=1)
-    return next_month - timedelta(days=1)
+    return value.replace(day=monthrange(value.year, value.month)[1])
 
 
-def get_default_expense_categories() -> List[Dict[str, str]]:
-    """Zwraca listę startowych kategorii wydatków używanych podczas rejestracji."""
-    return [
-        {
-            'name': 'Zakupy spożywcze',
-            'color': '#27ae60',
-            'icon_url': 'https://img.icons8.com/color/96/ingredients.png',
-        },
-        {
-            'name': 'Restauracje i kawiarnie',
-            'color': '#e67e22',
-            'icon_url': 'https://img.icons8.com/color/96/restaurant.png',
-        },
-        {
-            'name': 'Transport',
-            'color': '#2980b9',
-            'icon_url': 'https://img.icons8.com/color/96/car.png',
-        },
-        {
-            'name': 'Mieszkanie i rachunki',
-            'color': '#8e44ad',
-            'icon_url': 'https://img.icons8.com/color/96/home.png',
-        },
-        {
-            'name': 'Rozrywka',
-            'color': '#f39c12',
-            'icon_url': 'https://img.icons8.com/color/96/popcorn.png',
-        },
-        {
-            'name': 'Zdrowie i uroda',
-            'color': '#d35400',
-            'icon_url': 'https://img.icons8.com/color/96/spa.png',
-        },
-        {
-            'name': 'Edukacja',
-            'color': '#16a085',
-            'icon_url': 'https://img.icons8.com/color/96/graduation-cap.png',
-        },
-        {
-            'name': 'Podróże',
-            'color': '#1abc9c',
-            'icon_url': 'https://img.icons8.com/color/96/around-the-globe.png',
-        },
-        {
-            'name': 'Prezenty',
-            'color': '#c0392b',
-            'icon_url': 'https://img.icons8.com/color/96/gift.png',
-        },
-        {
-            'name': 'Hobby i sport',
-            'color': '#9b59b6',
-            'icon_url': 'https://img.icons8.com/color/96/dumbbell.png',
-        },
-        {
-            'name': 'Zwierzęta',
-            'color': '#2c3e50',
-            'icon_url': 'https://img.icons8.com/color/96/dog.png',
-        },
-        {
-            'name': 'Inne wydatki',
-            'color': '#7f8c8d',
-            'icon_url': 'https://img.icons8.com/color/96/more.png',
-        },
-    ]
+DEFAULT_EXPENSE_CATEGORIES: Tuple[Tuple[str, str, str], ...] = (
+    ('Zakupy spożywcze', '#27ae60', 'https://img.icons8.com/color/96/ingredients.png'),
+    ('Restauracje i kawiarnie', '#e67e22', 'https://img.icons8.com/color/96/restaurant.png'),
+    ('Transport', '#2980b9', 'https://img.icons8.com/color/96/car.png'),
+    ('Mieszkanie i rachunki', '#8e44ad', 'https://img.icons8.com/color/96/home.png'),
+    ('Rozrywka', '#f39c12', 'https://img.icons8.com/color/96/popcorn.png'),
+    ('Zdrowie i uroda', '#d35400', 'https://img.icons8.com/color/96/spa.png'),
+    ('Edukacja', '#16a085', 'https://img.icons8.com/color/96/graduation-cap.png'),
+    ('Podróże', '#1abc9c', 'https://img.icons8.com/color/96/around-the-globe.png'),
+    ('Prezenty', '#c0392b', 'https://img.icons8.com/color/96/gift.png'),
+    ('Hobby i sport', '#9b59b6', 'https://img.icons8.com/color/96/dumbbell.png'),
+    ('Zwierzęta', '#2c3e50', 'https://img.icons8.com/color/96/dog.png'),
+    ('Inne wydatki', '#7f8c8d', 'https://img.icons8.com/color/96/more.png'),
+)
+
+
+def get_default_expense_categories() -> Tuple[Tuple[str, str, str], ...]:
+    """Zwraca startowe kategorie wydatków (nazwa, kolor, ikona) używane podczas rejestracji."""
+    return DEFAULT_EXPENSE_CATEGORIES
 
 ALLOWED_TRANSACTION_KINDS = {
     'general',
@@ -149,16 +348,58 @@ DEFAULT_TRANSACTION_KIND = 'general'
 DEFAULT_BUDGET_TYPE = 'custom'
 
 
-def get_db_connection():
-    """Otwiera lokalną bazę SQLite i zwraca połączenie z rekordami jako słownikami."""
-    conn = sqlite3.connect(DATABASE_PATH)
-    conn.execute('PRAGMA journal_mode=WAL')
-    conn.execute('PRAGMA synchronous=NORMAL')
-    conn.execute('PRAGMA wal_autocheckpoint=1000')
+def get_db_connection(readonly: bool = False):
+    """Otwiera lokalną bazę SQLite (opcjonalnie tylko do odczytu) i zwraca połączenie z rekordami jako słownikami."""
+    global _WAL_ENABLED
+    if readonly:
+        conn = sqlite3.connect(
+            f'{Path(os.path.abspath(DATABASE_PATH)).as_uri()}?mode=ro',
+            uri=True,
+            cached_statements=SQLITE_CACHED_STATEMENTS,
+        )
+    else:
+        conn = sqlite3.connect(DATABASE_PATH, cached_statements=SQLITE_CACHED_STATEMENTS)
+    if not readonly and not _WAL_ENABLED:
+        # Tryb WAL jest zapisywany w pliku bazy, więc wystarczy ustawić go raz na proces.
+        mode = conn.execute('PRAGMA journal_mode=WAL').fetchone()[0]
+        _WAL_ENABLED = str(mode).lower() == 'wal'
+    for pragma in SQLITE_CONNECTION_PRAGMAS:
+        conn.execute(pragma)
     conn.row_factory = sqlite3.Row
     return conn
 
 
+def get_db(readonly: bool = False) -> sqlite3.Connection:
+    """Zwraca połączenie przypięte do bieżącego kontekstu aplikacji, otwierając je przy pierwszym użyciu."""
+    attr = '_db_ro' if readonly else '_db'
+    conn = getattr(g, attr, None)
+    if conn is None:
+        conn = get_db_connection(readonly)
+        setattr(g, attr, conn)
+    return conn
+
+
+@app.teardown_appcontext
+def close_db(exc: Optional[BaseException]) -> None:
+    """Zamyka połączenie kontekstu aplikacji po obsłużeniu żądania."""
+    for attr in ('_db', '_db_ro'):
+        conn = g.pop(attr, None)
+        if conn is not None:
+            conn.close()
+
+
+@contextmanager
+def db_connection(conn: Optional[sqlite3.Connection] = None, readonly: bool = False) -> Iterator[sqlite3.Connection]:
+    """Udostępnia przekazane połączenie, połączenie żądania albo - poza Flaskiem - nowe, zamykane po użyciu."""
+    if conn is not None:
+        yield conn
+    elif has_app_context():
+        yield get_db(readonly)
+    else:
+        with closing(get_db_connection(readonly)) as own_conn:
+            yield own_conn
+
+
 def init_db_for_connection(conn: sqlite3.Connection) -> None:
     """Tworzy wszystkie wymagane tabele wraz z kluczami obcymi w podanym połączeniu."""
     cursor = conn.cursor()
@@ -219,7 +460,7 @@ def init_db_for_connection(conn: sqlite3.Connection) -> None:
             type TEXT CHECK(type IN ('income','expense','transfer')) NOT NULL,
             amount REAL NOT NULL,
             currency TEXT DEFAULT 'PLN',
-            converted_amount REAL,
+            converted_amount REAL NOT NULL,
             note TEXT,
             kind TEXT DEFAULT 'general',
             budget_id INTEGER,
@@ -367,9 +608,216 @@ def table_exists(cursor, table: str) -> bool:
     return cursor.fetchone() is not None
 
 
-def migrate_db_for_connection(conn: sqlite3.Connection) -> None:
-    """Dodaje brakujące kolumny i pola kontrolne w podanym połączeniu."""
-    cursor = conn.cursor()
+def create_indexes_for_connection(cursor) -> None:
+    """Migracja 2: zakłada indeksy pod najczęstsze wyszukiwania."""
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_categories_user_type ON categories(user_id, type)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_transactions_user_date ON transactions(user_id, occurred_on)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_transactions_user_budget ON transactions(user_id, budget_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_recurring_user_next ON recurring_transactions(user_id, next_occurrence)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_savings_contrib_goal ON savings_goal_contributions(goal_id)')
+
+
+def create_listing_indexes_for_connection(cursor) -> None:
+    """Migracja 3: zakłada indeksy pod listy sortowane po dacie utworzenia i odświeża statystyki planera."""
+    cursor.execute('DROP INDEX IF EXISTS idx_categories_user_type')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_categories_user_type_created ON categories(user_id, type DESC, created_at DESC)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_budget_types_user_created ON budget_types(user_id, created_at DESC)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_recurring_user_created ON recurring_transactions(user_id, created_at DESC)')
+    cursor.execute('ANALYZE')
+
+
+def create_budget_spending_index_for_connection(cursor) -> None:
+    """Migracja 4: zakłada indeks pod sumowanie wydatków budżetów według typu i daty transakcji."""
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_transactions_user_type_date ON transactions(user_id, type, occurred_on)')
+    cursor.execute('ANALYZE')
+
+
+def create_owner_listing_indexes_for_connection(cursor) -> None:
+    """Migracja 5: zakłada indeksy pod listy budżetów, celów i transakcji filtrowane po właścicielu."""
+    cursor.execute('DROP INDEX IF EXISTS idx_transactions_user_date')
+    cursor.execute(
+        'CREATE INDEX IF NOT EXISTS idx_transactions_user_date_created '
+        'ON transactions(user_id, occurred_on DESC, created_at DESC)'
+    )
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_budgets_user_created ON budgets(user_id, created_at DESC)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_savings_goals_user_created ON savings_goals(user_id, created_at DESC)')
+    cursor.execute('ANALYZE')
+
+
+def create_covering_range_index_for_connection(cursor) -> None:
+    """Migracja 7: zastępuje indeks typu i daty transakcji wersją pokrywającą sumy dashboardu i budżetów."""
+    cursor.execute('DROP INDEX IF EXISTS idx_transactions_user_type_date')
+    cursor.execute(
+        'CREATE INDEX IF NOT EXISTS idx_transactions_user_type_date_cover '
+        'ON transactions(user_id, type, occurred_on, category_id, budget_id, currency, converted_amount, amount)'
+    )
+    cursor.execute('ANALYZE')
+
+
+def require_converted_amounts_for_connection(cursor) -> None:
+    """Migracja 8: uzupełnia brakujące kwoty w PLN i przebudowuje transakcje z converted_amount NOT NULL."""
+    cursor.execute('PRAGMA table_info(transactions)')
+    old_columns = {row[1]: row[3] for row in cursor.fetchall()}
+    if old_columns.get('converted_amount'):
+        return
+
+    cursor.execute(
+        f"SELECT 1 FROM transactions WHERE converted_amount IS NULL AND {SQL_TRANSACTION_CURRENCY_CODE} <> 'PLN' LIMIT 1"
+    )
+    if cursor.fetchall():
+        # Tabela kursów wypełnia się leniwie, więc przed przeliczeniem ładujemy ją z pliku cache albo z NBP.
+        ensure_currency_rates()
+    cursor.execute(
+        f'UPDATE transactions SET converted_amount = amount * CASE {SQL_TRANSACTION_CURRENCY_CODE} '
+        "WHEN 'PLN' THEN 1.0 "
+        f'ELSE (SELECT r.rate_to_pln FROM currency_rates r WHERE r.currency_code = {SQL_TRANSACTION_CURRENCY_CODE}) END '
+        'WHERE converted_amount IS NULL'
+    )
+    cursor.execute(
+        f'SELECT {SQL_TRANSACTION_CURRENCY_CODE}, COUNT(*) FROM transactions '
+        'WHERE converted_amount IS NULL GROUP BY 1'
+    )
+    missing_rates = cursor.fetchall()
+    if missing_rates:
+        logger.warning(
+            'Brak kursu dla walut %s (%s transakcji) - converted_amount pozostaje puste, '
+            'a przebudowa z NOT NULL zostanie ponowiona przy kolejnym starcie.',
+            ', '.join(row[0] for row in missing_rates),
+            sum(row[1] for row in missing_rates),
+        )
+        return
+
+    cursor.execute(
+        "SELECT sql FROM sqlite_master WHERE tbl_name = 'transactions' AND type IN ('index', 'trigger') AND sql IS NOT NULL"
+    )
+    dependent_sql = [row[0] for row in cursor.fetchall()]
+    cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'transactions'")
+    sequence_row = cursor.fetchone()
+    cursor.execute(
+        """
+        CREATE TABLE transactions_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            category_id INTEGER,
+            type TEXT CHECK(type IN ('income','expense','transfer')) NOT NULL,
+            amount REAL NOT NULL,
+            currency TEXT DEFAULT 'PLN',
+            converted_amount REAL NOT NULL,
+            note TEXT,
+            kind TEXT DEFAULT 'general',
+            budget_id INTEGER,
+            occurred_on TEXT NOT NULL,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE,
+            FOREIGN KEY(category_id) REFERENCES categories(id) ON DELETE SET NULL,
+            FOREIGN KEY(budget_id) REFERENCES budgets(id) ON DELETE SET NULL
+        )
+        """
+    )
+    cursor.execute('PRAGMA table_info(transactions_new)')
+    columns = ', '.join(row[1] for row in cursor.fetchall() if row[1] in old_columns)
+    cursor.execute(f'INSERT INTO transactions_new ({columns}) SELECT {columns} FROM transactions')
+    cursor.execute('DROP TABLE transactions')
+    cursor.execute('ALTER TABLE transactions_new RENAME TO transactions')
+    # Indeksy i triggery znikają razem ze starą tabelą, więc odtwarzamy je z zapamiętanych definicji.
+    for statement in dependent_sql:
+        cursor.execute(statement)
+    if sequence_row is not None:
+        cursor.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'transactions'", (sequence_row[0],))
+    cursor.execute('ANALYZE')
+
+
+def create_export_jobs_for_connection(cursor) -> None:
+    """Migracja 9: zakłada tabelę zleceń eksportu wykonywanych w tle."""
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS export_jobs (
+            id TEXT PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            status TEXT CHECK(status IN ('pending','running','done','failed')) NOT NULL DEFAULT 'pending',
+            file_path TEXT,
+            expires_at TEXT,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+        """
+    )
+
+
+SQL_MONTHLY_AGG_ADD_NEW = (
+    'INSERT INTO transaction_monthly_agg (user_id, ym, type, category_id, total, entries) '
+    'VALUES (NEW.user_id, substr(NEW.occurred_on, 1, 7), NEW.type, COALESCE(NEW.category_id, 0), '
+    'COALESCE(NEW.converted_amount, NEW.amount), 1) '
+    'ON CONFLICT (user_id, ym, type, category_id) '
+    'DO UPDATE SET total = total + excluded.total, entries = entries + 1;'
+)
+SQL_MONTHLY_AGG_OLD_KEY = (
+    'WHERE user_id = OLD.user_id AND ym = substr(OLD.occurred_on, 1, 7) '
+    'AND type = OLD.type AND category_id = COALESCE(OLD.category_id, 0)'
+)
+SQL_MONTHLY_AGG_SUBTRACT_OLD = (
+    'UPDATE transaction_monthly_agg '
+    'SET total = total - COALESCE(OLD.converted_amount, OLD.amount), entries = entries - 1 '
+    f'{SQL_MONTHLY_AGG_OLD_KEY}; '
+    f'DELETE FROM transaction_monthly_agg {SQL_MONTHLY_AGG_OLD_KEY} AND entries <= 0;'
+)
+
+
+def create_monthly_aggregates_for_connection(cursor) -> None:
+    """Migracja 6: zakłada miesięczne sumy transakcji utrzymywane triggerami i wypełnia je historią."""
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS transaction_monthly_agg (
+            user_id INTEGER NOT NULL,
+            ym TEXT NOT NULL,
+            type TEXT NOT NULL,
+            category_id INTEGER NOT NULL DEFAULT 0,
+            total REAL NOT NULL DEFAULT 0,
+            entries INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, ym, type, category_id)
+        ) WITHOUT ROWID
+        """
+    )
+    cursor.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_transactions_agg_insert
+        AFTER INSERT ON transactions
+        BEGIN
+            {SQL_MONTHLY_AGG_ADD_NEW}
+        END;
+        """
+    )
+    cursor.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_transactions_agg_delete
+        AFTER DELETE ON transactions
+        BEGIN
+            {SQL_MONTHLY_AGG_SUBTRACT_OLD}
+        END;
+        """
+    )
+    cursor.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_transactions_agg_update
+        AFTER UPDATE OF user_id, occurred_on, type, category_id, amount, converted_amount ON transactions
+        BEGIN
+            {SQL_MONTHLY_AGG_SUBTRACT_OLD}
+            {SQL_MONTHLY_AGG_ADD_NEW}
+        END;
+        """
+    )
+    cursor.execute('DELETE FROM transaction_monthly_agg')
+    cursor.execute(
+        'INSERT INTO transaction_monthly_agg (user_id, ym, type, category_id, total, entries) '
+        'SELECT user_id, substr(occurred_on, 1, 7), type, COALESCE(category_id, 0), '
+        'SUM(COALESCE(converted_amount, amount)), COUNT(*) '
+        'FROM transactions GROUP BY user_id, substr(occurred_on, 1, 7), type, COALESCE(category_id, 0)'
+    )
+
+
+def _migrate_legacy_columns(cursor) -> None:
+    """Migracja 1: dodaje tabele i kolumny brakujące w bazach sprzed wersjonowania schematu."""
     if not table_exists(cursor, 'budget_types'):
         cursor.execute(
             """
@@ -413,7 +861,35 @@ def migrate_db_for_connection(conn: sqlite3.Connection) -> None:
         cursor.execute('ALTER TABLE users ADD COLUMN monthly_income_day INTEGER')
     if not column_exists(cursor, 'users', 'monthly_income_currency'):
         cursor.execute("ALTER TABLE users ADD COLUMN monthly_income_currency TEXT DEFAULT 'PLN'")
-    conn.commit()
+
+
+SCHEMA_MIGRATIONS = (
+    _migrate_legacy_columns,
+    create_indexes_for_connection,
+    create_listing_indexes_for_connection,
+    create_budget_spending_index_for_connection,
+    create_owner_listing_indexes_for_connection,
+    create_monthly_aggregates_for_connection,
+    create_covering_range_index_for_connection,
+    require_converted_amounts_for_connection,
+    create_export_jobs_for_connection,
+)
+
+
+def migrate_db_for_connection(conn: sqlite3.Connection) -> None:
+    """Uruchamia kolejne migracje schematu, których numer przekracza PRAGMA user_version bazy."""
+    cursor = conn.cursor()
+    version = cursor.execute('PRAGMA user_version').fetchone()[0]
+    for target_version, migration in enumerate(SCHEMA_MIGRATIONS, start=1):
+        if version >= target_version:
+            continue
+        migration(cursor)
+        cursor.execute(f'PRAGMA user_version = {target_version}')
+        conn.commit()
+    # Migracja 8 odkłada przebudowę, dopóki brakuje kursu którejś waluty, więc przy kolejnych startach ją ponawiamy.
+    if version >= SCHEMA_MIGRATIONS.index(require_converted_amounts_for_connection) + 1:
+        require_converted_amounts_for_connection(cursor)
+        conn.commit()
 
 
 def migrate_db():
@@ -423,10 +899,6 @@ def migrate_db():
 
 
 
-init_db()
-migrate_db()
-
-
 @app.route('/')
 def home():
     """Zwraca prostą odpowiedź JSON informującą, że API działa."""
@@ -445,36 +917,32 @@ def is_strong_password(password: str) -> bool:
 
 def hash_password(password: str) -> str:
     """Szyfruje hasło użytkownika algorytmem bcrypt przed zapisaniem."""
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=BCRYPT_COST)).decode('utf-8')
 
 
-def check_password(password: str, hashed: str) -> bool:
-    """Porównuje podane hasło z przechowywanym hashem i zwraca wynik uwierzytelnienia."""
+def check_password(password: str, hashed: Optional[str]) -> bool:
+    """Porównuje podane hasło z przechowywanym hashem, odrzucając bez liczenia bcrypt hashe w innym formacie."""
+    if not hashed or not hashed.startswith(BCRYPT_HASH_PREFIXES):
+        return False
     return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
 
 
-def slugify(value: str) -> str:
-    """Przekształca dowolny tekst w prosty identyfikator nadający się na slug."""
-    slug = re.sub(r'[^a-z0-9]+', '-', value.lower())
-    slug = slug.strip('-')
-    return slug or 'category'
+_DUMMY_PASSWORD_HASH = hash_password('savoo-timing-guard')
 
-    def normalize_security_question_key(value: Optional[str]) -> Optional[str]:
-        """Porządkuje klucz pytania bezpieczeństwa do porównania ze słownikiem."""
-        if not value:
-            return None
-        return value.strip().lower()
 
-
-    def is_security_question_valid(value: Optional[str]) -> bool:
-        """Weryfikuje, czy przekazany klucz pytania należy do dostępnej listy."""
-        normalized = normalize_security_question_key(value)
-        return normalized in SECURITY_QUESTION_CHOICES
+def password_needs_rehash(hashed: str) -> bool:
+    """Sprawdza, czy hash bcrypt został wyliczony z innym kosztem niż obecny BCRYPT_COST."""
+    try:
+        return int(hashed.split('$')[2]) != BCRYPT_COST
+    except (IndexError, ValueError):
+        return False
 
 
-    def generate_reset_token() -> str:
-        """Generuje jednorazowy token używany do resetu hasła."""
-        return secrets.token_urlsafe(32)
+def slugify(value: str) -> str:
+    """Przekształca dowolny tekst w prosty identyfikator nadający się na slug."""
+    slug = SLUG_REGEX.sub('-', value.lower())
+    slug = slug.strip('-')
+    return slug or 'category'
 
 
 def normalize_security_question_key(value: Optional[str]) -> Optional[str]:
@@ -490,6 +958,17 @@ def is_security_question_valid(value: Optional[str]) -> bool:
     return normalized in SECURITY_QUESTION_CHOICES
 
 
+def _utcnow_iso() -> str:
+    """Zwraca bieżący czas UTC w ISO, liczony raz na żądanie i współdzielony przez wszystkie zapisy."""
+    if not has_app_context():
+        return datetime.utcnow().isoformat()
+    now_iso = g.get('now_iso')
+    if now_iso is None:
+        now_iso = datetime.utcnow().isoformat()
+        g.now_iso = now_iso
+    return now_iso
+
+
 def generate_reset_token() -> str:
     """Generuje jednorazowy token używany do resetu hasła."""
     return secrets.token_urlsafe(32)
@@ -502,6 +981,7 @@ def log_budget_notification(budget_name: str, message: str) -> None:
 
 def _store_currency_rates(rates: Dict[str, float], fetched_at: str) -> None:
     """Czyści tabelę kursów i zapisuje w niej przekazane notowania walut."""
+    global _RATES_CACHE
     sanitized: Dict[str, float] = {'PLN': 1.0}
     for code, value in rates.items():
         if not code:
@@ -511,56 +991,120 @@ def _store_currency_rates(rates: Dict[str, float], fetched_at: str) -> None:
         except (TypeError, ValueError):
             continue
 
+    rows = [(currency_code, rate, fetched_at) for currency_code, rate in sanitized.items()]
     with closing(get_db_connection()) as conn:
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM currency_rates')
-        for currency_code, rate in sanitized.items():
-            cursor.execute(
-                'INSERT OR REPLACE INTO currency_rates (currency_code, rate_to_pln, fetched_at) VALUES (?, ?, ?)',
-                (currency_code, rate, fetched_at),
-            )
+        conn.execute('BEGIN IMMEDIATE')
+        conn.execute('DELETE FROM currency_rates')
+        conn.executemany(
+            'INSERT OR REPLACE INTO currency_rates (currency_code, rate_to_pln, fetched_at) VALUES (?, ?, ?)',
+            rows,
+        )
         conn.commit()
+    _RATES_CACHE = None
+    _CURRENCIES_CACHE['expires_at'] = 0.0
 
 
 def ensure_currency_rates(force_refresh: bool = False) -> None:
     """Pilnuje aktualności kursów walut, korzystając z cache albo NBP."""
-    now = datetime.utcnow()
-    cache_data: Optional[Dict[str, Any]] = None
-    if not force_refresh and os.path.exists(CURRENCY_CACHE_PATH):
+    with _RATES_REFRESH_LOCK:
+        _refresh_currency_rates(force_refresh)
+
+
+def _read_currency_cache_file() -> Optional[Dict[str, Any]]:
+    """Wczytuje zawartość pliku cache kursów walut lub zwraca None."""
+    if not os.path.exists(CURRENCY_CACHE_PATH):
+        return None
+    try:
+        with open(CURRENCY_CACHE_PATH, 'rb') as cache_file:
+            cache_data = orjson.loads(cache_file.read())
+    except (OSError, orjson.JSONDecodeError):
+        return None
+    return cache_data if isinstance(cache_data, dict) else None
+
+
+def _is_currency_cache_fresh(cache_data: Optional[Dict[str, Any]], now: datetime) -> bool:
+    """Sprawdza, czy dane z cache kursów mieszczą się w czasie ważności."""
+    if not cache_data or not cache_data.get('fetched_at'):
+        return False
+    try:
+        cache_timestamp = datetime.fromisoformat(cache_data['fetched_at'])
+    except (TypeError, ValueError):
+        return False
+    return now - cache_timestamp <= CURRENCY_CACHE_TTL
+
+
+@contextmanager
+def _currency_fetch_lock() -> Iterator[None]:
+    """Blokuje pobieranie kursów między procesami (np. workerami gunicorna) na pliku blokady."""
+    if fcntl is None:
+        yield
+        return
+    with open(CURRENCY_CACHE_LOCK_PATH, 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
         try:
-            with open(CURRENCY_CACHE_PATH, 'r', encoding='utf-8') as cache_file:
-                cache_data = json.load(cache_file)
-        except (OSError, json.JSONDecodeError):
-            cache_data = None
-
-    if cache_data and not force_refresh:
-        fetched_at_str = cache_data.get('fetched_at')
-        rates = cache_data.get('rates') or {}
-        cache_timestamp: Optional[datetime] = None
-        if fetched_at_str:
-            try:
-                cache_timestamp = datetime.fromisoformat(fetched_at_str)
-            except ValueError:
-                cache_timestamp = None
-        if cache_timestamp and now - cache_timestamp <= CURRENCY_CACHE_TTL:
-            _store_currency_rates(rates, fetched_at_str)
-            return
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
 
+
+def _refresh_currency_rates(force_refresh: bool) -> None:
+    """Odczytuje kursy z cache w pamięci lub pliku albo pobiera je z NBP i zapisuje w bazie."""
+    global _CURRENCY_CACHE_MEM
+    now = datetime.utcnow()
+    if not force_refresh:
+        if _is_currency_cache_fresh(_CURRENCY_CACHE_MEM, now):
+            return
+        if _CURRENCY_CACHE_MEM is None:
+            _CURRENCY_CACHE_MEM = _read_currency_cache_file()
+            if _is_currency_cache_fresh(_CURRENCY_CACHE_MEM, now):
+                _store_currency_rates(_CURRENCY_CACHE_MEM.get('rates') or {}, _CURRENCY_CACHE_MEM['fetched_at'])
+                return
+
+    with _currency_fetch_lock():
+        cache_data: Optional[Dict[str, Any]] = None
+        if not force_refresh:
+            # Inny proces mógł odświeżyć plik, gdy czekaliśmy na blokadę.
+            cache_data = _read_currency_cache_file() or _CURRENCY_CACHE_MEM
+            if _is_currency_cache_fresh(cache_data, now):
+                _CURRENCY_CACHE_MEM = cache_data
+                _store_currency_rates(cache_data.get('rates') or {}, cache_data['fetched_at'])
+                return
+        _fetch_currency_rates(cache_data, now)
+
+
+def _fetch_currency_rates(cache_data: Optional[Dict[str, Any]], now: datetime) -> None:
+    """Pobiera tabelę kursów z NBP, zapisuje ją w bazie, w pamięci i w pliku cache."""
+    global _CURRENCY_CACHE_MEM
+    now_iso = now.isoformat()
+    conditional_headers: Dict[str, str] = {}
+    if cache_data:
+        if cache_data.get('etag'):
+            conditional_headers['If-None-Match'] = cache_data['etag']
+        if cache_data.get('last_modified'):
+            conditional_headers['If-Modified-Since'] = cache_data['last_modified']
+
+    not_modified = False
+    raw_rates: List[Dict[str, Any]] = []
     try:
-        response = requests.get(NBP_API_URL, timeout=5)
-        response.raise_for_status()
-        payload = response.json()
-        raw_rates = payload[0]['rates'] if payload else []
+        response = _NBP_SESSION.get(NBP_API_URL, timeout=5, headers=conditional_headers)
+        if response.status_code == 304 and cache_data:
+            not_modified = True
+        else:
+            response.raise_for_status()
+            payload = response.json()
+            raw_rates = payload[0]['rates'] if payload else []
     except Exception as exc:
         logger.warning('Nie udało się pobrać kursów walut: %s', exc)
         if cache_data:
-            fetched_at_str = cache_data.get('fetched_at') or now.isoformat()
+            fetched_at_str = cache_data.get('fetched_at') or now_iso
             rates = cache_data.get('rates') or {}
             _store_currency_rates(rates, fetched_at_str)
         return
 
-    fetched_at = datetime.utcnow().isoformat()
+    fetched_at = now_iso
     extracted_rates: Dict[str, float] = {}
+    if not_modified:
+        extracted_rates = cache_data.get('rates') or {}
     for item in raw_rates:
         code = item.get('code')
         value = item.get('mid')
@@ -572,30 +1116,77 @@ def ensure_currency_rates(force_refresh: bool = False) -> None:
 
     _store_currency_rates(extracted_rates, fetched_at)
 
+    previous = cache_data or {}
     cache_payload = {
         'fetched_at': fetched_at,
         'rates': extracted_rates,
+        'etag': response.headers.get('ETag') or previous.get('etag'),
+        'last_modified': response.headers.get('Last-Modified') or previous.get('last_modified'),
     }
+    _CURRENCY_CACHE_MEM = cache_payload
     try:
-        with open(CURRENCY_CACHE_PATH, 'w', encoding='utf-8') as cache_file:
-            json.dump(cache_payload, cache_file, ensure_ascii=False, indent=2)
+        with open(CURRENCY_CACHE_PATH, 'wb') as cache_file:
+            cache_file.write(orjson.dumps(cache_payload, option=orjson.OPT_INDENT_2))
     except OSError as exc:
         logger.warning('Nie udało się zapisać cache kursów walut: %s', exc)
 
 
+def _load_rates_cache() -> Dict[str, float]:
+    """Zwraca słownik kursów z pamięci procesu, wczytując go z bazy po unieważnieniu."""
+    global _RATES_CACHE, _RATES_CACHE_LOADED_AT
+    rates = _RATES_CACHE
+    if rates is not None:
+        return rates
+
+    with _RATES_CACHE_LOCK:
+        if _RATES_CACHE is None:
+            if _RATES_CACHE_LOADED_AT is None:
+                ensure_currency_rates()
+            with closing(get_db_connection()) as conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT currency_code, rate_to_pln FROM currency_rates')
+                _RATES_CACHE = {row['currency_code']: float(row['rate_to_pln']) for row in cursor.fetchall()}
+            _RATES_CACHE_LOADED_AT = datetime.utcnow()
+        return _RATES_CACHE
+
+
+def _currency_rates_refresh_loop() -> None:
+    """Co pół okresu ważności cache odświeża kursy walut w tle."""
+    interval = CURRENCY_CACHE_TTL.total_seconds() / 2
+    while True:
+        time.sleep(interval)
+        try:
+            ensure_currency_rates()
+        except Exception:
+            logger.exception('Odświeżanie kursów walut w tle nie powiodło się.')
+
+
+def start_currency_rates_refresher() -> None:
+    """Uruchamia wątek odświeżający kursy walut, jeśli jeszcze nie działa."""
+    global _RATES_REFRESH_THREAD
+    if _RATES_REFRESH_THREAD is not None and _RATES_REFRESH_THREAD.is_alive():
+        return
+    _RATES_REFRESH_THREAD = threading.Thread(
+        target=_currency_rates_refresh_loop,
+        name='savoo-currency-refresh',
+        daemon=True,
+    )
+    _RATES_REFRESH_THREAD.start()
+
+
 def get_exchange_rate(currency: str) -> float:
-    """Zwraca kurs danej waluty względem PLN, odczytując go z lokalnej tabeli."""
+    """Zwraca kurs danej waluty względem PLN, korzystając z kursów trzymanych w pamięci."""
     if not currency:
         return 1.0
     currency = currency.upper()
     if currency == 'PLN':
         return 1.0
-    ensure_currency_rates()
-    with closing(get_db_connection()) as conn:
-        cursor = conn.cursor()
-        cursor.execute('SELECT rate_to_pln FROM currency_rates WHERE currency_code = ?', (currency,))
-        row = cursor.fetchone()
-        return float(row['rate_to_pln']) if row else 1.0
+    return _load_rates_cache().get(currency, 1.0)
+
+
+init_db()
+migrate_db()
+start_currency_rates_refresher()
 
 
 def convert_amount(amount: float, source_currency: str, target_currency: str) -> float:
@@ -606,16 +1197,19 @@ def convert_amount(amount: float, source_currency: str, target_currency: str) ->
     target = (target_currency or 'PLN').upper()
     if source == target:
         return float(amount)
+    if target == 'PLN':
+        return float(amount) * get_exchange_rate(source)
+    if source == 'PLN':
+        target_rate = get_exchange_rate(target)
+        return float(amount) / target_rate if target_rate else float(amount)
     source_rate = get_exchange_rate(source)
     target_rate = get_exchange_rate(target)
     if target_rate == 0:
         return float(amount) * source_rate
-    amount_pln = float(amount) * source_rate
-    if target == 'PLN':
-        return amount_pln
-    return amount_pln / target_rate
+    return float(amount) * source_rate / target_rate
 
 
+@lru_cache(maxsize=64)
 def normalize_currency(value: Optional[str], fallback: str = BASE_CURRENCY) -> str:
     """Normalizuje kod waluty do formatu ISO (np. PLN, EUR)."""
     if not value:
@@ -624,6 +1218,33 @@ def normalize_currency(value: Optional[str], fallback: str = BASE_CURRENCY) -> s
     return normalized or fallback
 
 
+def _normalize_currency_input(value: Any, default: str) -> str:
+    """Zwraca kod waluty z danych wejściowych wielkimi literami albo wartość domyślną dla pustych i nietekstowych."""
+    if isinstance(value, str):
+        value = value.strip()
+        if value:
+            return value.upper()
+    return default
+
+
+def _parse_float(value: Any) -> Optional[float]:
+    """Zamienia liczbę lub tekst z przecinkiem albo kropką na float, zwracając None dla niepoprawnych danych."""
+    if isinstance(value, str):
+        value = value.replace(',', '.').strip()
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_int(value: Any) -> Optional[int]:
+    """Zamienia wartość na int, zwracając None, gdy nie da się jej odczytać."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
 def convert_to_base(amount: float, currency: Optional[str]) -> float:
     """Konwertuje kwotę do waluty bazowej (PLN)."""
     return convert_amount(amount, normalize_currency(currency), BASE_CURRENCY)
@@ -634,35 +1255,89 @@ def convert_from_base(amount: float, currency: Optional[str]) -> float:
     return convert_amount(amount, BASE_CURRENCY, normalize_currency(currency))
 
 
+def base_rate_divisor(currency: Optional[str]) -> float:
+    """Zwraca dzielnik, przez który kwota w PLN przechodzi na wskazaną walutę, do wyznaczenia raz na żądanie."""
+    return get_exchange_rate(normalize_currency(currency)) or 1.0
+
+
 def get_user_by_email(cursor, email: str):
-    """Pobiera rekord użytkownika na podstawie adresu e-mail."""
-    cursor.execute('SELECT * FROM users WHERE email = ?', (email,))
+    """Pobiera rekord użytkownika na podstawie adresu e-mail, zapamiętując go do końca bieżącego żądania."""
+    cache = g.setdefault('_user_cache', {}) if has_app_context() else None
+    if cache is not None and email in cache:
+        return cache[email]
+    cursor.execute(SQL_GET_USER_BY_EMAIL, (email,))
+    user = cursor.fetchone()
+    if cache is not None and user is not None:
+        cache[email] = user
+    return user
+
+
+def forget_cached_user(email: str) -> None:
+    """Usuwa użytkownika z pamięci podręcznej żądania po zmianie jego rekordu."""
+    if has_app_context():
+        g.get('_user_cache', {}).pop(email, None)
+
+
+def get_user_auth_row(cursor, email: str):
+    """Pobiera tylko kolumny potrzebne do uwierzytelnienia użytkownika o podanym e-mailu."""
+    cursor.execute(SQL_GET_USER_AUTH_ROW, (email,))
+    return cursor.fetchone()
+
+
+def insert_and_fetch(cursor, table: str, insert_sql: str, params: Tuple[Any, ...], columns: str = '*'):
+    """Wstawia rekord i zwraca wskazane kolumny; przy starszym SQLite dobiera je osobnym zapytaniem po ID."""
+    if SQLITE_SUPPORTS_RETURNING:
+        cursor.execute(f'{insert_sql} RETURNING {columns}', params)
+        return cursor.fetchone()
+    cursor.execute(insert_sql, params)
+    cursor.execute(f'SELECT {columns} FROM {table} WHERE id = ?', (cursor.lastrowid,))
     return cursor.fetchone()
 
 
+def fetch_dicts(conn: sqlite3.Connection, sql: str, params: Tuple[Any, ...], fields: Tuple[str, ...]) -> List[Dict[str, Any]]:
+    """Wykonuje zapytanie o wskazane kolumny i zwraca wiersze jako słowniki zbudowane wprost z krotek."""
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    cursor.execute(sql, params)
+    return [dict(zip(fields, row)) for row in cursor]
+
+
 def get_user_by_id(cursor, user_id: int):
     """Zwraca rekord użytkownika wskazanego identyfikatorem."""
-    cursor.execute('SELECT * FROM users WHERE id = ?', (user_id,))
+    cursor.execute(SQL_GET_USER_BY_ID, (user_id,))
     return cursor.fetchone()
 
 
-def authenticate_user(email: str, password: str) -> Optional[sqlite3.Row]:
+def get_user_currency(cursor, user_id: int) -> str:
+    """Zwraca znormalizowaną walutę domyślną użytkownika, zapamiętaną na czas bieżącego żądania."""
+    cache: Dict[int, str] = g.setdefault('_user_currencies', {}) if has_app_context() else {}
+    currency = cache.get(user_id)
+    if currency is None:
+        cursor.execute(SQL_GET_USER_CURRENCY, (user_id,))
+        row = cursor.fetchone()
+        currency = cache[user_id] = normalize_currency(row['default_currency'] if row else None)
+    return currency
+
+
+def authenticate_user(email: str, password: str, conn: Optional[sqlite3.Connection] = None) -> Optional[sqlite3.Row]:
     """Normalizuje dane logowania i zwraca użytkownika tylko przy poprawnym haśle."""
     normalized_email = (email or '').strip().lower()
     if not normalized_email or not password:
         return None
-    with closing(get_db_connection()) as conn:
+    with db_connection(conn) as conn:
         cursor = conn.cursor()
-        user = get_user_by_email(cursor, normalized_email)
+        user = get_user_auth_row(cursor, normalized_email)
         if not user:
+            check_password(password, _DUMMY_PASSWORD_HASH)
             return None
         if not check_password(password, user['password_hash']):
             return None
         return user
 
 
+@lru_cache(maxsize=512)
 def _parse_basic_auth_header(auth_header: str) -> Tuple[Optional[str], Optional[str]]:
-    """Dekoduje nagłówek Basic Auth i wyciąga z niego e-mail oraz hasło."""
+    """Dekoduje nagłówek Basic Auth i wyciąga z niego e-mail oraz hasło (wynik jest zapamiętywany)."""
     if not auth_header or not auth_header.startswith('Basic '):
         return None, None
     encoded = auth_header.split(' ', 1)[1].strip()
@@ -703,34 +1378,55 @@ def auth_required(roles: Optional[Tuple[str, ...]] = None):
 
     return decorator
 
-def seed_default_categories(user_id: int) -> None:
+def seed_default_categories(user_id: int, conn: Optional[sqlite3.Connection] = None) -> None:
     """Zakłada nowe konto startowymi kategoriami wydatków, jeśli jeszcze ich nie ma."""
-    with closing(get_db_connection()) as conn:
+    with db_connection(conn) as conn:
         cursor = conn.cursor()
-        cursor.execute('SELECT name FROM categories WHERE user_id = ? AND type = ?', (user_id, 'expense'))
-        existing_names = {row['name'] for row in cursor.fetchall()}
-        inserted = False
-        for template in get_default_expense_categories():
-            if template['name'] in existing_names:
-                continue
-            cursor.execute(
-                'INSERT INTO categories (user_id, name, type, color, icon_url) VALUES (?, ?, ?, ?, ?)',
-                (
-                    user_id,
-                    template['name'],
-                    'expense',
-                    template['color'],
-                    template['icon_url'],
-                ),
-            )
-            category_id = cursor.lastrowid
-            cursor.execute('SELECT * FROM categories WHERE id = ?', (category_id,))
-            row = cursor.fetchone()
-            if row:
-                inserted = True
-            existing_names.add(template['name'])
-        if inserted:
-            conn.commit()
+        cursor.execute('SELECT DISTINCT name FROM categories WHERE user_id = ? AND type = ?', (user_id, 'expense'))
+        existing_names = {row[0] for row in cursor}
+        to_insert = [
+            (user_id, name, 'expense', color, icon_url)
+            for name, color, icon_url in get_default_expense_categories()
+            if name not in existing_names
+        ]
+        if to_insert and conn.in_transaction:
+            # Wywołujący prowadzi własną transakcję (np. zbiorczy zasiew) i sam ją zatwierdzi.
+            cursor.executemany(SQL_INSERT_CATEGORY, to_insert)
+        elif to_insert:
+            with conn:
+                cursor.executemany(
+                    SQL_INSERT_CATEGORY,
+                    to_insert,
+                )
+
+
+def _seed_default_categories_job(user_id: int, done: threading.Event) -> None:
+    """Dosiewa kategorie w wątku roboczym na własnym połączeniu i zawsze zwalnia oczekujących."""
+    try:
+        seed_default_categories(user_id)
+    except Exception:
+        logger.exception('Nie udało się dodać domyślnych kategorii dla użytkownika %s', user_id)
+    finally:
+        with _SEEDING_LOCK:
+            _SEEDING_EVENTS.pop(user_id, None)
+        done.set()
+
+
+def schedule_default_categories(user_id: int) -> None:
+    """Zleca dosianie domyślnych kategorii w tle, oznaczając użytkownika jako będącego w trakcie zasiewu."""
+    done = threading.Event()
+    with _SEEDING_LOCK:
+        _SEEDING_EVENTS[user_id] = done
+    _SEED_EXECUTOR.submit(_seed_default_categories_job, user_id, done)
+
+
+def wait_for_default_categories(user_id: int, timeout: float = SEED_WAIT_TIMEOUT_SECONDS) -> bool:
+    """Czeka na zakończenie zasiewu kategorii użytkownika; zwraca False, jeśli nie skończył się w czasie."""
+    with _SEEDING_LOCK:
+        done = _SEEDING_EVENTS.get(user_id)
+    if done is None:
+        return True
+    return done.wait(timeout)
 
 
 def add_months(base_date: date, months: int) -> date:
@@ -738,7 +1434,7 @@ def add_months(base_date: date, months: int) -> date:
     month = base_date.month - 1 + months
     year = base_date.year + month // 12
     month = month % 12 + 1
-    day = min(base_date.day, [31, 29 if year % 4 == 0 and (year % 100 != 0 or year % 400 == 0) else 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31][month - 1])
+    day = min(base_date.day, monthrange(year, month)[1])
     return date(year, month, day)
 
 
@@ -757,91 +1453,156 @@ def next_recurring_date(current_date: date, frequency: str) -> date:
     return current_date + timedelta(days=30)
 
 
-def process_recurring_transactions(user_id: int) -> None:
-    """Generuje zaległe cykliczne transakcje i aktualizuje ich harmonogram."""
+def process_recurring_transactions(user_id: int, conn: Optional[sqlite3.Connection] = None) -> None:
+    """Generuje zaległe cykliczne transakcje i aktualizuje ich harmonogram na przekazanym połączeniu, nie zamykając go."""
     today = date.today()
     today_str = today.isoformat()
-    with closing(get_db_connection()) as conn:
+    with db_connection(conn) as conn:
         cursor = conn.cursor()
-        cursor.execute(
-            "SELECT * FROM recurring_transactions WHERE user_id = ? AND next_occurrence <= ? AND (end_date IS NULL OR next_occurrence <= end_date)",
-            (user_id, today_str),
-        )
-        recurrences = [dict(row) for row in cursor.fetchall()]
-        if not recurrences:
+        cursor.execute(SQL_HAS_DUE_RECURRENCES, (user_id, today_str))
+        if cursor.fetchone() is None:
             return
 
-        user = get_user_by_id(cursor, user_id)
-        user_currency = user['default_currency'] if user else 'PLN'
+        # Kursy muszą być wczytane przed blokadą, bo ich pierwsze pobranie zapisuje do bazy osobnym połączeniem.
+        _load_rates_cache()
+        with conn:
+            # Blokada zapisu przed ponownym odczytem chroni przed podwójnym wygenerowaniem wpisów przez równoległe żądania.
+            if not conn.in_transaction:
+                conn.execute('BEGIN IMMEDIATE')
+            cursor.execute(SQL_LIST_DUE_RECURRENCES, (user_id, today_str))
+            recurrences = cursor.fetchmany(RECURRENCE_FETCH_BATCH)
+            if not recurrences:
+                return
+
+            user_currency = get_user_currency(conn.cursor(), user_id)
+
+            pending_inserts: List[Tuple[Any, ...]] = []
+            pending_updates: List[Tuple[Any, ...]] = []
+            while recurrences:
+                for recurrence in recurrences:
+                    occurrence_date = datetime.fromisoformat(recurrence['next_occurrence']).date()
+                    end_date = datetime.fromisoformat(recurrence['end_date']).date() if recurrence['end_date'] else None
+                    next_date = occurrence_date
+                    last_generated = recurrence['last_generated']
+                    category_id = recurrence['category_id']
+                    txn_type = recurrence['type']
+                    note = recurrence['note']
+                    frequency = recurrence['frequency']
+                    txn_currency = (recurrence['currency'] or user_currency or 'PLN').upper()
+                    amount = float(recurrence['amount'])
+                    converted_amount = convert_amount(amount, txn_currency, user_currency)
+                    while next_date <= today and (end_date is None or next_date <= end_date):
+                        last_generated = next_date.isoformat()
+                        pending_inserts.append((
+                            user_id,
+                            category_id,
+                            txn_type,
+                            amount,
+                            txn_currency,
+                            converted_amount,
+                            note,
+                            last_generated,
+                        ))
+                        next_date = next_recurring_date(next_date, frequency)
+
+                    pending_updates.append((next_date.isoformat(), last_generated, recurrence['id']))
+                recurrences = cursor.fetchmany(RECURRENCE_FETCH_BATCH)
+
+            cursor.executemany(
+                SQL_INSERT_RECURRING_OCCURRENCE,
+                pending_inserts,
+            )
+            cursor.executemany(
+                SQL_UPDATE_RECURRENCE_SCHEDULE,
+                pending_updates,
+            )
 
-        for recurrence in recurrences:
-            occurrence_date = datetime.fromisoformat(recurrence['next_occurrence']).date()
-            end_date = datetime.fromisoformat(recurrence['end_date']).date() if recurrence.get('end_date') else None
-            next_date = occurrence_date
-            while next_date <= today and (end_date is None or next_date <= end_date):
-                txn_currency = (recurrence.get('currency') or user_currency or 'PLN').upper()
-                converted_amount = convert_amount(recurrence['amount'], txn_currency, user_currency)
-                cursor.execute(
-                    'INSERT INTO transactions (user_id, category_id, type, amount, currency, converted_amount, note, occurred_on) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
-                    (
-                        user_id,
-                        recurrence.get('category_id'),
-                        recurrence['type'],
-                        float(recurrence['amount']),
-                        txn_currency,
-                        converted_amount,
-                        recurrence.get('note'),
-                        next_date.isoformat(),
-                    ),
-                )
-                recurrence['last_generated'] = next_date.isoformat()
-                next_date = next_recurring_date(next_date, recurrence['frequency'])
 
-            cursor.execute(
-                'UPDATE recurring_transactions SET next_occurrence = ?, last_generated = ? WHERE id = ?',
-                (next_date.isoformat(), recurrence.get('last_generated'), recurrence['id']),
-            )
-        conn.commit()
+def budget_alert_mask(limits: List[float], spent: List[float], threshold: float) -> List[bool]:
+    """Dla równoległych list limitów i wydatków wskazuje budżety, które przekroczyły próg ostrzeżenia."""
+    return [
+        limit > 0 and (spent_amount > limit or spent_amount / limit >= threshold)
+        for limit, spent_amount in zip(limits, spent)
+    ]
 
 
-def maybe_send_budget_notification(conn, cursor, budget: dict) -> bool:
-    """Sprawdza wykorzystanie budżetu i loguje ostrzeżenie, ograniczając się do lokalnych komunikatów."""
-    limit_amount = float(budget.get('limit_amount') or 0)
-    spent = float(budget.get('spent_amount') or 0)
+def _budget_notification_message(budget: dict, today_iso: str) -> Optional[str]:
+    """Zwraca treść ostrzeżenia dla budżetu bliskiego lub ponad limitem albo None, gdy nie trzeba go wysyłać."""
+    last_notified = budget.get('last_notified_at')
+    if last_notified and last_notified[:10] == today_iso:
+        return None
+
+    limit_amount = budget.get('limit_amount') or 0.0
+    if not isinstance(limit_amount, float):
+        limit_amount = float(limit_amount)
     if limit_amount <= 0:
-        return False
-    utilization = spent / limit_amount if limit_amount else 0
+        return None
+    spent = budget.get('spent_amount') or 0.0
+    if not isinstance(spent, float):
+        spent = float(spent)
+    utilization = spent / limit_amount
     over_limit = spent > limit_amount
-    threshold_hit = utilization >= BUDGET_ALERT_THRESHOLD or over_limit
-    if not threshold_hit:
-        return False
-
-    last_notified = budget.get('last_notified_at')
-    if last_notified and last_notified[:10] == date.today().isoformat():
-        return False
+    if utilization < BUDGET_ALERT_THRESHOLD and not over_limit:
+        return None
 
     if over_limit:
-        body = f"Budżet przekroczony: wydatki {spent:.2f} / limit {limit_amount:.2f}."
-    else:
-        body = f"Budżet osiągnął {utilization * 100:.0f}% progu. Pozostało {limit_amount - spent:.2f}."
+        return f"Budżet przekroczony: wydatki {spent:.2f} / limit {limit_amount:.2f}."
+    return f"Budżet osiągnął {utilization * 100:.0f}% progu. Pozostało {limit_amount - spent:.2f}."
+
+
+def send_budget_notifications(conn: sqlite3.Connection, budgets: List[dict]) -> int:
+    """Loguje ostrzeżenia dla przekazanych budżetów i zapisuje znaczniki powiadomień w jednej transakcji."""
+    today_iso = date.today().isoformat()
+    timestamp = _utcnow_iso()
+    notified: List[Tuple[str, int]] = []
+    for budget in budgets:
+        body = _budget_notification_message(budget, today_iso)
+        if body is None:
+            continue
+        log_budget_notification(budget.get('name') or 'Budżet', body)
+        budget['last_notified_at'] = timestamp
+        notified.append((timestamp, budget['id']))
+
+    if notified:
+        with conn:
+            conn.executemany(SQL_UPDATE_BUDGET_NOTIFIED, notified)
+    return len(notified)
+
+
+def _send_budget_notifications_job(budgets: List[dict]) -> None:
+    """Wysyła ostrzeżenia budżetowe w wątku roboczym, odświeżając znaczniki zapisane przez wcześniejsze zadania."""
+    try:
+        with closing(get_db_connection()) as conn:
+            placeholders = ', '.join('?' for _ in budgets)
+            cursor = conn.execute(
+                f'SELECT id, last_notified_at FROM budgets WHERE id IN ({placeholders})',
+                [budget['id'] for budget in budgets],
+            )
+            stamps = {row['id']: row['last_notified_at'] for row in cursor.fetchall()}
+            send_budget_notifications(conn, [
+                {**budget, 'last_notified_at': stamps[budget['id']]}
+                for budget in budgets
+                if budget['id'] in stamps
+            ])
+    except Exception:
+        logger.exception('Nie udało się wysłać powiadomień budżetowych')
 
-    log_budget_notification(budget.get('name') or 'Budżet', body)
-    timestamp = datetime.utcnow().isoformat()
-    cursor.execute(
-        'UPDATE budgets SET last_notified_at = ? WHERE id = ?',
-        (timestamp, budget['id']),
-    )
-    budget['last_notified_at'] = timestamp
-    conn.commit()
-    return True
+
+def schedule_budget_notifications(budgets: List[dict]) -> None:
+    """Zleca wysłanie ostrzeżeń budżetowych w tle, aby odczyt budżetów nie czekał na zapis znaczników."""
+    if budgets:
+        _NOTIFY_EXECUTOR.submit(_send_budget_notifications_job, budgets)
 
 
 @app.route('/currencies', methods=['GET'])
 def list_currencies():
     """Udostępnia endpoint zwracający listę kursów walut zapisanych w cache."""
     refresh = request.args.get('refresh', '').strip().lower() == 'true'
+    if not refresh and time.monotonic() < _CURRENCIES_CACHE['expires_at']:
+        return app.response_class(_CURRENCIES_CACHE['body'], mimetype='application/json')
+
     ensure_currency_rates(force_refresh=refresh)
-    with closing(get_db_connection()) as conn:
+    with db_connection() as conn:
         cursor = conn.cursor()
         cursor.execute('SELECT currency_code, rate_to_pln, fetched_at FROM currency_rates ORDER BY currency_code ASC')
         rows = cursor.fetchall()
@@ -853,7 +1614,10 @@ def list_currencies():
         }
         for row in rows
     ]
-    return jsonify({'success': True, 'currencies': currencies})
+    response = _json({'success': True, 'currencies': currencies})
+    _CURRENCIES_CACHE['body'] = response.get_data()
+    _CURRENCIES_CACHE['expires_at'] = time.monotonic() + CURRENCIES_RESPONSE_TTL_SECONDS
+    return response
 
 
 @app.route('/register', methods=['POST'])
@@ -874,33 +1638,33 @@ def register():
         return jsonify({'success': False, 'message': 'Wybierz pytanie bezpieczeństwa z listy.'}), 400
     if len(security_answer) < 3:
         return jsonify({'success': False, 'message': 'Odpowiedź na pytanie bezpieczeństwa musi mieć co najmniej 3 znaki.'}), 400
-    with closing(get_db_connection()) as conn:
+    with db_connection() as conn:
         cursor = conn.cursor()
         if get_user_by_email(cursor, email):
             return jsonify({'success': False, 'message': 'Konto o podanym e-mailu już istnieje.'}), 409
 
         password_hash = hash_password(password)
         security_answer_hash = hash_password(security_answer)
-        cursor.execute(
-            'INSERT INTO users (email, password_hash, display_name, role, security_question_key, security_answer_hash) VALUES (?, ?, ?, ?, ?, ?)',
-            (
-                email,
-                password_hash,
-                display_name or None,
-                'user',
-                security_question_key,
-                security_answer_hash,
-            ),
-        )
-        user_id = cursor.lastrowid
-        conn.commit()
-        cursor.execute('SELECT * FROM users WHERE id = ?', (user_id,))
-        user_row = cursor.fetchone()
+        with conn:
+            user_row = insert_and_fetch(
+                cursor,
+                'users',
+                'INSERT INTO users (email, password_hash, display_name, role, security_question_key, security_answer_hash) VALUES (?, ?, ?, ?, ?, ?)',
+                (
+                    email,
+                    password_hash,
+                    display_name or None,
+                    'user',
+                    security_question_key,
+                    security_answer_hash,
+                ),
+                'id, email, display_name, role, default_currency, monthly_income, monthly_income_currency, monthly_income_day',
+            )
 
     if not user_row:
         return jsonify({'success': False, 'message': 'Nie udało się utworzyć konta.'}), 500
 
-    seed_default_categories(user_row['id'])
+    schedule_default_categories(user_row['id'])
 
     monthly_income = user_row['monthly_income']
     monthly_income_currency = user_row['monthly_income_currency'] or user_row['default_currency'] or 'PLN'
@@ -932,8 +1696,7 @@ def login():
     if not email or not password:
         return jsonify({'success': False, 'message': 'Wprowadź e-mail i hasło.'}), 400
 
-    user_row = None
-    with closing(get_db_connection()) as conn:
+    with db_connection() as conn:
         cursor = conn.cursor()
         user_row = get_user_by_email(cursor, email)
         if not user_row:
@@ -942,17 +1705,18 @@ def login():
         if not check_password(password, user_row['password_hash']):
             return jsonify({'success': False, 'message': 'Nieprawidłowy e-mail lub hasło.'}), 401
 
-        timestamp = datetime.utcnow().isoformat()
-        cursor.execute(
-            'UPDATE users SET last_login_at = ?, updated_at = ? WHERE id = ?',
-            (timestamp, timestamp, user_row['id']),
-        )
-        conn.commit()
-        cursor.execute('SELECT * FROM users WHERE id = ?', (user_row['id'],))
-        user_row = cursor.fetchone()
-
-    if not user_row:
-        return jsonify({'success': False, 'message': 'Nie udało się zalogować użytkownika.'}), 500
+        timestamp = _utcnow_iso()
+        with conn:
+            cursor.execute(
+                SQL_UPDATE_LAST_LOGIN,
+                (timestamp, timestamp, user_row['id']),
+            )
+            if password_needs_rehash(user_row['password_hash']):
+                cursor.execute(
+                    SQL_UPDATE_PASSWORD_HASH,
+                    (hash_password(password), user_row['id']),
+                )
+        forget_cached_user(email)
 
     login_income = user_row['monthly_income']
     monthly_income_currency = user_row['monthly_income_currency'] or user_row['default_currency'] or 'PLN'
@@ -994,7 +1758,7 @@ def forgot_password_verify():
     if not answer:
         return jsonify({'success': False, 'message': 'Podaj odpowiedź na pytanie bezpieczeństwa.'}), 400
 
-    with closing(get_db_connection()) as conn:
+    with db_connection() as conn:
         cursor = conn.cursor()
         user = get_user_by_email(cursor, email)
         if not user:
@@ -1010,11 +1774,12 @@ def forgot_password_verify():
 
         token = generate_reset_token()
         expires_at = (datetime.utcnow() + RESET_TOKEN_TTL).isoformat()
-        cursor.execute(
-            'UPDATE users SET reset_token = ?, reset_token_expires_at = ? WHERE id = ?',
-            (token, expires_at, user['id']),
-        )
-        conn.commit()
+        with conn:
+            cursor.execute(
+                'UPDATE users SET reset_token = ?, reset_token_expires_at = ? WHERE id = ?',
+                (token, expires_at, user['id']),
+            )
+        forget_cached_user(email)
 
     return jsonify({
         'success': True,
@@ -1042,7 +1807,7 @@ def forgot_password_reset():
     if not is_strong_password(new_password):
         return jsonify({'success': False, 'message': 'Nowe hasło nie spełnia wymagań złożoności.'}), 400
 
-    with closing(get_db_connection()) as conn:
+    with db_connection() as conn:
         cursor = conn.cursor()
         user = get_user_by_email(cursor, email)
         if not user:
@@ -1064,11 +1829,12 @@ def forgot_password_reset():
             return jsonify({'success': False, 'message': 'Token resetu wygasł. Spróbuj ponownie.'}), 400
 
         password_hash = hash_password(new_password)
-        cursor.execute(
-            'UPDATE users SET password_hash = ?, reset_token = NULL, reset_token_expires_at = NULL WHERE id = ?',
-            (password_hash, user['id']),
-        )
-        conn.commit()
+        with conn:
+            cursor.execute(
+                'UPDATE users SET password_hash = ?, reset_token = NULL, reset_token_expires_at = NULL WHERE id = ?',
+                (password_hash, user['id']),
+            )
+        forget_cached_user(email)
 
     return jsonify({'success': True, 'message': 'Hasło zostało zaktualizowane. Możesz się zalogować.'})
 
@@ -1084,14 +1850,14 @@ def profile():
         if target_email != current_user['email'] and current_user.get('role') != 'admin':
             return jsonify({'success': False, 'message': 'Brak uprawnień do podglądu profilu innego użytkownika.'}), 403
 
-        with closing(get_db_connection()) as conn:
+        with db_connection() as conn:
             cursor = conn.cursor()
             user = get_user_by_email(cursor, target_email)
             if not user:
                 return jsonify({'success': False, 'message': 'Nie znaleziono użytkownika.'}), 404
             monthly_income = user['monthly_income']
             monthly_income_currency = user['monthly_income_currency'] or user['default_currency'] or 'PLN'
-            return jsonify({
+            return _json({
                 'success': True,
                 'profile': {
                     'email': user['email'],
@@ -1111,37 +1877,27 @@ def profile():
     if target_email != current_user['email'] and current_user.get('role') != 'admin':
         return jsonify({'success': False, 'message': 'Brak uprawnień do edycji innego profilu.'}), 403
 
-    updated_user = None
-    with closing(get_db_connection()) as conn:
+    with db_connection() as conn:
         cursor = conn.cursor()
         user = get_user_by_email(cursor, target_email)
         if not user:
             return jsonify({'success': False, 'message': 'Nie znaleziono użytkownika.'}), 404
 
-        default_currency = data.get('default_currency') or user['default_currency'] or 'PLN'
-        if isinstance(default_currency, str):
-            default_currency = default_currency.strip().upper() or 'PLN'
-
-        income_currency = data.get('monthly_income_currency') or user.get('monthly_income_currency') or default_currency
-        if isinstance(income_currency, str):
-            income_currency = income_currency.strip().upper() or default_currency
+        default_currency = _normalize_currency_input(data.get('default_currency'), user['default_currency'] or 'PLN')
+        income_currency = _normalize_currency_input(
+            data.get('monthly_income_currency'),
+            user['monthly_income_currency'] or default_currency,
+        )
 
         monthly_income_value = user['monthly_income']
         if 'monthly_income' in data:
-            monthly_income_raw = data.get('monthly_income', 0)
-            if isinstance(monthly_income_raw, str):
-                monthly_income_raw = monthly_income_raw.replace(',', '.').strip()
-            try:
-                monthly_income_value = float(monthly_income_raw)
-            except (TypeError, ValueError):
+            monthly_income_value = _parse_float(data.get('monthly_income'))
+            if monthly_income_value is None:
                 return jsonify({'success': False, 'message': 'Niepoprawna kwota miesięcznego dochodu.'}), 400
 
         existing_income_day = user['monthly_income_day']
         if existing_income_day is not None:
-            try:
-                existing_income_day = int(existing_income_day)
-            except (TypeError, ValueError):
-                existing_income_day = None
+            existing_income_day = _parse_int(existing_income_day)
 
         income_day_value = existing_income_day
         if 'monthly_income_day' in data:
@@ -1149,30 +1905,28 @@ def profile():
             if income_day_raw in (None, '', 'null'):
                 income_day_value = None
             else:
-                try:
-                    income_day_candidate = int(income_day_raw)
-                except (TypeError, ValueError):
+                income_day_candidate = _parse_int(income_day_raw)
+                if income_day_candidate is None:
                     return jsonify({'success': False, 'message': 'Niepoprawny dzień wypłaty.'}), 400
                 if income_day_candidate < 1 or income_day_candidate > 31:
                     return jsonify({'success': False, 'message': 'Dzień wypłaty musi być z zakresu 1-31.'}), 400
                 income_day_value = income_day_candidate
 
-        timestamp = datetime.utcnow().isoformat()
-        cursor.execute(
-            'UPDATE users SET display_name = ?, default_currency = ?, monthly_income = ?, monthly_income_currency = ?, monthly_income_day = ?, updated_at = ? WHERE email = ?',
-            (
-                data.get('display_name'),
-                default_currency,
-                monthly_income_value,
-                income_currency,
-                income_day_value,
-                timestamp,
-                target_email,
-            ),
-        )
-        conn.commit()
-        cursor.execute('SELECT * FROM users WHERE email = ?', (target_email,))
-        updated_user = cursor.fetchone()
+        timestamp = _utcnow_iso()
+        with conn:
+            cursor.execute(
+                'UPDATE users SET display_name = ?, default_currency = ?, monthly_income = ?, monthly_income_currency = ?, monthly_income_day = ?, updated_at = ? WHERE email = ?',
+                (
+                    data.get('display_name'),
+                    default_currency,
+                    monthly_income_value,
+                    income_currency,
+                    income_day_value,
+                    timestamp,
+                    target_email,
+                ),
+            )
+        forget_cached_user(target_email)
 
     return jsonify({'success': True, 'message': 'Profil zaktualizowany.'})
 
@@ -1180,22 +1934,17 @@ def profile():
 def resolve_user_id(cursor, email: Optional[str]):
     """Na podstawie bieżącej sesji i e-maila określa ID użytkownika przy zachowaniu ról."""
     current = getattr(g, 'current_user', None)
-
-    if current:
-        if email and email != current['email'] and current.get('role') != 'admin':
-            return None
+    if current is not None:
         if not email or email == current['email']:
             return current['id']
-
-    if not email:
+        if current.get('role') != 'admin':
+            return None
+    elif not email:
         return None
 
-    user = get_user_by_email(cursor, email)
-    if not user:
-        return None
-    if current and current.get('role') != 'admin' and user['id'] != current['id']:
-        return None
-    return user['id']
+    cursor.execute(SQL_GET_USER_ID_BY_EMAIL, (email,))
+    user = cursor.fetchone()
+    return user['id'] if user else None
 
 
 @app.route('/categories', methods=['GET', 'POST'])
@@ -1205,18 +1954,16 @@ def categories():
     if request.method == 'GET':
         target_email = request.args.get('email', '').strip().lower() or None
 
-        with closing(get_db_connection()) as conn:
+        with db_connection() as conn:
             cursor = conn.cursor()
             user_id = resolve_user_id(cursor, target_email)
             if not user_id:
                 return jsonify({'success': False, 'message': 'Brak uprawnień lub użytkownik nie istnieje.'}), 403
-            cursor.execute(
-                'SELECT * FROM categories WHERE user_id = ? ORDER BY type DESC, created_at DESC',
-                (user_id,),
-            )
-            items = [dict(row) for row in cursor.fetchall()]
+            if request.args.get('wait', '').strip().lower() in ('1', 'true'):
+                wait_for_default_categories(user_id)
+            items = fetch_dicts(conn, SQL_LIST_CATEGORIES, (user_id,), CATEGORY_FIELDS)
 
-        return jsonify({'success': True, 'categories': items})
+        return _json({'success': True, 'categories': items})
 
     data = request.get_json(silent=True) or {}
     target_email = data.get('email', '').strip().lower() or None
@@ -1225,23 +1972,22 @@ def categories():
     color = data.get('color', '#2ecc71')
     icon_url = (data.get('icon_url') or '').strip() or None
 
-    if not name or category_type not in {'income', 'expense'}:
+    if not name or category_type not in CATEGORY_TYPES:
         return jsonify({'success': False, 'message': 'Brak wymaganych danych.'}), 400
 
-    with closing(get_db_connection()) as conn:
+    with db_connection() as conn:
         cursor = conn.cursor()
         user_id = resolve_user_id(cursor, target_email)
         if not user_id:
             return jsonify({'success': False, 'message': 'Brak uprawnień lub użytkownik nie istnieje.'}), 403
 
-        cursor.execute(
-            'INSERT INTO categories (user_id, name, type, color, icon_url) VALUES (?, ?, ?, ?, ?)',
-            (user_id, name, category_type, color, icon_url),
-        )
-        category_id = cursor.lastrowid
-        cursor.execute('SELECT * FROM categories WHERE id = ?', (category_id,))
-        category_row = cursor.fetchone()
-        conn.commit()
+        with conn:
+            category_row = insert_and_fetch(
+                cursor,
+                'categories',
+                SQL_INSERT_CATEGORY,
+                (user_id, name, category_type, color, icon_url),
+            )
 
     return jsonify({
         'success': True,
@@ -1256,15 +2002,15 @@ def category_detail(category_id):
     """Aktualizuje albo usuwa konkretną kategorię należącą do użytkownika."""
     if request.method == 'DELETE':
         target_email = request.args.get('email', '').strip().lower() or None
-        with closing(get_db_connection()) as conn:
+        with db_connection() as conn:
             cursor = conn.cursor()
             user_id = resolve_user_id(cursor, target_email)
             if not user_id:
                 return jsonify({'success': False, 'message': 'Brak uprawnień lub użytkownik nie istnieje.'}), 403
-            cursor.execute('DELETE FROM categories WHERE id = ? AND user_id = ?', (category_id, user_id))
-            if cursor.rowcount == 0:
-                return jsonify({'success': False, 'message': 'Nie znaleziono kategorii.'}), 404
-            conn.commit()
+            with conn:
+                cursor.execute('DELETE FROM categories WHERE id = ? AND user_id = ?', (category_id, user_id))
+                if cursor.rowcount == 0:
+                    return jsonify({'success': False, 'message': 'Nie znaleziono kategorii.'}), 404
         return jsonify({'success': True, 'message': 'Kategoria usunięta.'})
 
     data = request.get_json(silent=True) or {}
@@ -1274,42 +2020,35 @@ def category_detail(category_id):
     color = data.get('color')
     icon_url = data.get('icon_url')
 
-    with closing(get_db_connection()) as conn:
+    with db_connection() as conn:
         cursor = conn.cursor()
         user_id = resolve_user_id(cursor, target_email)
         if not user_id:
             return jsonify({'success': False, 'message': 'Brak uprawnień lub użytkownik nie istnieje.'}), 403
 
-        cursor.execute('SELECT * FROM categories WHERE id = ? AND user_id = ?', (category_id, user_id))
-        existing = cursor.fetchone()
-        if not existing:
+        cursor.execute('SELECT 1 FROM categories WHERE id = ? AND user_id = ?', (category_id, user_id))
+        if cursor.fetchone() is None:
             return jsonify({'success': False, 'message': 'Nie znaleziono kategorii.'}), 404
 
-        updates = {
-            'name': name or None,
-            'type': category_type if category_type in {'income', 'expense'} else None,
-            'color': color,
-            'icon_url': icon_url,
-        }
-
-        set_parts = []
+        values = (
+            name or None,
+            category_type if category_type in CATEGORY_TYPES else None,
+            color,
+            icon_url,
+        )
+        mask = 0
         params = []
-        for key, value in updates.items():
+        for bit, value in enumerate(values):
             if value is not None:
-                set_parts.append(f"{key} = ?")
+                mask |= 1 << bit
                 params.append(value)
 
-        if not set_parts:
+        if not mask:
             return jsonify({'success': False, 'message': 'Brak danych do aktualizacji.'}), 400
 
         params.extend([category_id, user_id])
-        cursor.execute(
-            f"UPDATE categories SET {', '.join(set_parts)} WHERE id = ? AND user_id = ?",
-            params,
-        )
-        cursor.execute('SELECT * FROM categories WHERE id = ? AND user_id = ?', (category_id, user_id))
-        category_row = cursor.fetchone()
-        conn.commit()
+        with conn:
+            cursor.execute(SQL_UPDATE_CATEGORY[mask], params)
 
     return jsonify({'success': True, 'message': 'Kategoria zaktualizowana.'})
 
@@ -1321,18 +2060,14 @@ def budget_types():
     if request.method == 'GET':
         target_email = request.args.get('email', '').strip().lower() or None
 
-        with closing(get_db_connection()) as conn:
+        with db_connection() as conn:
             cursor = conn.cursor()
             user_id = resolve_user_id(cursor, target_email)
             if not user_id:
                 return jsonify({'success': False, 'message': 'Brak uprawnień lub użytkownik nie istnieje.'}), 403
-            cursor.execute(
-                'SELECT * FROM budget_types WHERE user_id = ? ORDER BY created_at DESC',
-                (user_id,),
-            )
-            items = [dict(row) for row in cursor.fetchall()]
+            items = fetch_dicts(conn, SQL_LIST_BUDGET_TYPES, (user_id,), BUDGET_TYPE_FIELDS)
 
-        return jsonify({'success': True, 'budget_types': items})
+        return _json({'success': True, 'budget_types': items})
 
     data = request.get_json(silent=True) or {}
     target_email = data.get('email', '').strip().lower() or None
@@ -1341,23 +2076,22 @@ def budget_types():
         return jsonify({'success': False, 'message': 'Nazwa rodzaju budżetu jest zbyt krótka.'}), 400
 
     normalized = raw_name.lower()
-    with closing(get_db_connection()) as conn:
+    with db_connection() as conn:
         cursor = conn.cursor()
         user_id = resolve_user_id(cursor, target_email)
         if not user_id:
             return jsonify({'success': False, 'message': 'Brak uprawnień lub użytkownik nie istnieje.'}), 403
 
         try:
-            cursor.execute(
-                'INSERT INTO budget_types (user_id, name) VALUES (?, ?)',
-                (user_id, normalized),
-            )
+            with conn:
+                row = insert_and_fetch(
+                    cursor,
+                    'budget_types',
+                    'INSERT INTO budget_types (user_id, name) VALUES (?, ?)',
+                    (user_id, normalized),
+                )
         except sqlite3.IntegrityError:
             return jsonify({'success': False, 'message': 'Taki rodzaj budżetu już istnieje.'}), 409
-        budget_type_id = cursor.lastrowid
-        cursor.execute('SELECT * FROM budget_types WHERE id = ?', (budget_type_id,))
-        row = cursor.fetchone()
-        conn.commit()
 
     return jsonify({
         'success': True,
@@ -1371,15 +2105,15 @@ def budget_types():
 def budget_type_detail(type_id: int):
     """Usuwa wybrany typ budżetu użytkownika."""
     target_email = request.args.get('email', '').strip().lower() or None
-    with closing(get_db_connection()) as conn:
+    with db_connection() as conn:
         cursor = conn.cursor()
         user_id = resolve_user_id(cursor, target_email)
         if not user_id:
             return jsonify({'success': False, 'message': 'Brak uprawnień lub użytkownik nie istnieje.'}), 403
-        cursor.execute('DELETE FROM budget_types WHERE id = ? AND user_id = ?', (type_id, user_id))
-        if cursor.rowcount == 0:
-            return jsonify({'success': False, 'message': 'Nie znaleziono rodzaju budżetu.'}), 404
-        conn.commit()
+        with conn:
+            cursor.execute('DELETE FROM budget_types WHERE id = ? AND user_id = ?', (type_id, user_id))
+            if cursor.rowcount == 0:
+                return jsonify({'success': False, 'message': 'Nie znaleziono rodzaju budżetu.'}), 404
     return jsonify({'success': True, 'message': 'Rodzaj budżetu usunięty.'})
 
 
@@ -1388,6 +2122,9 @@ def parse_iso_date(value: Optional[str]) -> str:
     if not value:
         return date.today().isoformat()
     try:
+        if ISO_DATE_REGEX.fullmatch(value):
+            date.fromisoformat(value)
+            return value
         return datetime.fromisoformat(value).date().isoformat()
     except ValueError:
         return date.today().isoformat()
@@ -1399,17 +2136,13 @@ def recurring_transactions():
     """Listuje bądź dodaje cykliczne transakcje po sprawdzeniu uprawnień."""
     if request.method == 'GET':
         target_email = request.args.get('email', '').strip().lower() or None
-        with closing(get_db_connection()) as conn:
+        with db_connection() as conn:
             cursor = conn.cursor()
             user_id = resolve_user_id(cursor, target_email)
             if not user_id:
                 return jsonify({'success': False, 'message': 'Brak uprawnień lub użytkownik nie istnieje.'}), 403
-            cursor.execute(
-                'SELECT * FROM recurring_transactions WHERE user_id = ? ORDER BY created_at DESC',
-                (user_id,),
-            )
-            items = [dict(row) for row in cursor.fetchall()]
-        return jsonify({'success': True, 'recurring_transactions': items})
+            items = fetch_dicts(conn, SQL_LIST_RECURRING_TRANSACTIONS, (user_id,), RECURRING_TRANSACTION_FIELDS)
+        return _json({'success': True, 'recurring_transactions': items})
 
     data = request.get_json(silent=True) or {}
     target_email = data.get('email', '').strip().lower() or None
@@ -1421,40 +2154,41 @@ def recurring_transactions():
     currency = (data.get('currency') or '').strip().upper() or None
     category_id = data.get('category_id')
 
-    if amount is None or txn_type not in {'income', 'expense', 'transfer'}:
+    if amount is None or txn_type not in TRANSACTION_TYPES:
         return jsonify({'success': False, 'message': 'Brak wymaganych danych.'}), 400
-    if frequency not in {'daily', 'weekly', 'monthly', 'quarterly', 'yearly'}:
+    if frequency not in RECURRENCE_FREQUENCIES:
         return jsonify({'success': False, 'message': 'Niepoprawna częstotliwość.'}), 400
     if txn_type == 'expense' and not category_id:
         return jsonify({'success': False, 'message': 'Wybierz kategorię wydatku przed zapisaniem cyklicznej transakcji.'}), 400
 
-    with closing(get_db_connection()) as conn:
+    with db_connection() as conn:
         cursor = conn.cursor()
         user_id = resolve_user_id(cursor, target_email)
         if not user_id:
             return jsonify({'success': False, 'message': 'Brak uprawnień lub użytkownik nie istnieje.'}), 403
 
-        if category_id:
-            cursor.execute('SELECT id FROM categories WHERE id = ? AND user_id = ?', (category_id, user_id))
-            if not cursor.fetchone():
-                return jsonify({'success': False, 'message': 'Wybrana kategoria nie istnieje.'}), 404
-
-        cursor.execute(
-            'INSERT INTO recurring_transactions (user_id, category_id, type, amount, currency, note, frequency, start_date, next_occurrence, end_date) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
-            (
-                user_id,
-                category_id,
-                txn_type,
-                float(amount),
-                currency,
-                data.get('note'),
-                frequency,
-                start_date,
-                start_date,
-                end_date,
-            ),
-        )
-        conn.commit()
+        owned_category_id = category_id or None
+        with conn:
+            cursor.execute(
+                SQL_INSERT_RECURRING_TRANSACTION,
+                (
+                    user_id,
+                    category_id,
+                    txn_type,
+                    float(amount),
+                    currency,
+                    data.get('note'),
+                    frequency,
+                    start_date,
+                    start_date,
+                    end_date,
+                    owned_category_id,
+                    owned_category_id,
+                    user_id,
+                ),
+            )
+        if cursor.rowcount != 1:
+            return jsonify({'success': False, 'message': 'Wybrana kategoria nie istnieje.'}), 404
 
     return jsonify({'success': True, 'message': 'Cykliczna transakcja dodana.'})
 
@@ -1465,27 +2199,27 @@ def recurring_transaction_detail(recurring_id):
     """Pozwala zmienić lub usunąć pojedynczą cykliczną transakcję użytkownika."""
     if request.method == 'DELETE':
         target_email = request.args.get('email', '').strip().lower() or None
-        with closing(get_db_connection()) as conn:
+        with db_connection() as conn:
             cursor = conn.cursor()
             user_id = resolve_user_id(cursor, target_email)
             if not user_id:
                 return jsonify({'success': False, 'message': 'Brak uprawnień lub użytkownik nie istnieje.'}), 403
-            cursor.execute('DELETE FROM recurring_transactions WHERE id = ? AND user_id = ?', (recurring_id, user_id))
-            if cursor.rowcount == 0:
-                return jsonify({'success': False, 'message': 'Nie znaleziono pozycji.'}), 404
-            conn.commit()
+            with conn:
+                cursor.execute('DELETE FROM recurring_transactions WHERE id = ? AND user_id = ?', (recurring_id, user_id))
+                if cursor.rowcount == 0:
+                    return jsonify({'success': False, 'message': 'Nie znaleziono pozycji.'}), 404
         return jsonify({'success': True, 'message': 'Pozycja usunięta.'})
 
     data = request.get_json(silent=True) or {}
     target_email = data.get('email', '').strip().lower() or None
 
-    with closing(get_db_connection()) as conn:
+    with db_connection() as conn:
         cursor = conn.cursor()
         user_id = resolve_user_id(cursor, target_email)
         if not user_id:
             return jsonify({'success': False, 'message': 'Brak uprawnień lub użytkownik nie istnieje.'}), 403
 
-        cursor.execute('SELECT * FROM recurring_transactions WHERE id = ? AND user_id = ?', (recurring_id, user_id))
+        cursor.execute(SQL_GET_RECURRING_EDIT_STATE, (recurring_id, user_id))
         existing = cursor.fetchone()
         if not existing:
             return jsonify({'success': False, 'message': 'Nie znaleziono pozycji.'}), 404
@@ -1493,12 +2227,12 @@ def recurring_transaction_detail(recurring_id):
         updates: Dict[str, Any] = {}
         if data.get('category_id') is not None:
             updates['category_id'] = data.get('category_id')
-            cursor.execute('SELECT id FROM categories WHERE id = ? AND user_id = ?', (updates['category_id'], user_id))
+            cursor.execute(SQL_GET_OWNED_CATEGORY_ID, (updates['category_id'], user_id))
             if not cursor.fetchone():
                 return jsonify({'success': False, 'message': 'Wybrana kategoria nie istnieje.'}), 404
         if data.get('type') is not None:
             new_type = (data.get('type') or '').strip().lower()
-            if new_type not in {'income', 'expense', 'transfer'}:
+            if new_type not in TRANSACTION_TYPES:
                 return jsonify({'success': False, 'message': 'Niepoprawny typ transakcji.'}), 400
             updates['type'] = new_type
         if data.get('amount') is not None:
@@ -1509,7 +2243,7 @@ def recurring_transaction_detail(recurring_id):
             updates['note'] = data.get('note')
         if data.get('frequency') is not None:
             new_frequency = (data.get('frequency') or '').strip().lower()
-            if new_frequency not in {'daily', 'weekly', 'monthly', 'quarterly', 'yearly'}:
+            if new_frequency not in RECURRENCE_FREQUENCIES:
                 return jsonify({'success': False, 'message': 'Niepoprawna częstotliwość.'}), 400
             updates['frequency'] = new_frequency
         if data.get('start_date') is not None:
@@ -1529,18 +2263,16 @@ def recurring_transaction_detail(recurring_id):
         if final_type == 'expense' and not final_category_id:
             return jsonify({'success': False, 'message': 'Wybierz kategorię wydatku.'}), 400
 
-        set_parts = []
+        mask = 0
         params: list[Any] = []
-        for key, value in updates.items():
-            set_parts.append(f"{key} = ?")
-            params.append(value)
+        for bit, column in enumerate(RECURRING_UPDATE_COLUMNS):
+            if column in updates:
+                mask |= 1 << bit
+                params.append(updates[column])
 
         params.extend([recurring_id, user_id])
-        cursor.execute(
-            f"UPDATE recurring_transactions SET {', '.join(set_parts)} WHERE id = ? AND user_id = ?",
-            params,
-        )
-        conn.commit()
+        with conn:
+            cursor.execute(SQL_UPDATE_RECURRING_TRANSACTION[mask], params)
 
     return jsonify({'success': True, 'message': 'Pozycja zaktualizowana.'})
 
@@ -1554,25 +2286,15 @@ def transactions():
         start = request.args.get('start_date') or None
         end = request.args.get('end_date') or None
 
-        user_id: Optional[int] = None
-        with closing(get_db_connection()) as conn:
+        with db_connection() as conn:
             cursor = conn.cursor()
             user_id = resolve_user_id(cursor, target_email)
             if not user_id:
                 return jsonify({'success': False, 'message': 'Brak uprawnień lub użytkownik nie istnieje.'}), 403
 
-        process_recurring_transactions(user_id)
-
-        with closing(get_db_connection()) as conn:
-            cursor = conn.cursor()
-            user = get_user_by_id(cursor, user_id)
-            user_currency = normalize_currency(user['default_currency'] if user else None)
-            query = (
-                'SELECT t.*, b.name AS budget_name, b.budget_type AS budget_type '
-                'FROM transactions t '
-                'LEFT JOIN budgets b ON t.budget_id = b.id '
-                'WHERE t.user_id = ?'
-            )
+            process_recurring_transactions(user_id, conn)
+            user_currency = get_user_currency(cursor, user_id)
+            query = SQL_LIST_TRANSACTIONS
             params: list[Any] = [user_id]
             if start:
                 query += ' AND t.occurred_on >= ?'
@@ -1581,20 +2303,23 @@ def transactions():
                 query += ' AND t.occurred_on <= ?'
                 params.append(end)
             query += ' ORDER BY t.occurred_on DESC, t.created_at DESC'
-            cursor.execute(query, params)
+        with db_connection(readonly=True) as read_conn:
+            # Kursy są stałe w obrębie odpowiedzi, więc wyznaczamy je raz na walutę zamiast przy każdym wierszu.
+            display_divisor = base_rate_divisor(user_currency)
+            sources: Dict[Optional[str], str] = {}
             items = []
-            for row in cursor.fetchall():
-                item = dict(row)
-                base_amount = item.get('converted_amount')
-                if base_amount is None:
-                    base_amount = convert_to_base(
-                        float(item.get('amount') or 0),
-                        normalize_currency(item.get('currency') or user_currency),
-                    )
-                item['display_amount'] = convert_from_base(base_amount, user_currency)
+            for item in fetch_dicts(read_conn, query, tuple(params), TRANSACTION_LIST_FIELDS):
+                raw_currency = item['currency']
+                source = sources.get(raw_currency)
+                if source is None:
+                    source = sources[raw_currency] = normalize_currency(raw_currency or user_currency)
+                if source == user_currency:
+                    item['display_amount'] = float(item['amount'] or 0)
+                else:
+                    item['display_amount'] = float(item['converted_amount']) / display_divisor
                 item['display_currency'] = user_currency
                 items.append(item)
-        return jsonify({'success': True, 'transactions': items})
+        return _json({'success': True, 'transactions': items})
 
     data = request.get_json(silent=True) or {}
     target_email = data.get('email', '').strip().lower() or None
@@ -1616,29 +2341,18 @@ def transactions():
         except (TypeError, ValueError):
             return jsonify({'success': False, 'message': 'Niepoprawny identyfikator budżetu.'}), 400
 
-    if amount is None or txn_type not in {'income', 'expense', 'transfer'}:
+    if amount is None or txn_type not in TRANSACTION_TYPES:
         return jsonify({'success': False, 'message': 'Brak wymaganych danych.'}), 400
     if txn_type == 'expense' and not category_id and not budget_id:
         return jsonify({'success': False, 'message': 'Wybierz kategorię lub budżet dla wydatku.'}), 400
 
-    user_id: Optional[int] = None
-    with closing(get_db_connection()) as conn:
+    with db_connection() as conn:
         cursor = conn.cursor()
         user_id = resolve_user_id(cursor, target_email)
         if not user_id:
             return jsonify({'success': False, 'message': 'Brak uprawnień lub użytkownik nie istnieje.'}), 403
 
-        if category_id:
-            cursor.execute('SELECT id FROM categories WHERE id = ? AND user_id = ?', (category_id, user_id))
-            if not cursor.fetchone():
-                return jsonify({'success': False, 'message': 'Wybrana kategoria nie istnieje.'}), 404
-        if budget_id:
-            cursor.execute('SELECT id FROM budgets WHERE id = ? AND user_id = ?', (budget_id, user_id))
-            if not cursor.fetchone():
-                return jsonify({'success': False, 'message': 'Wybrany budżet nie istnieje.'}), 404
-
-        user = get_user_by_id(cursor, user_id)
-        user_currency = normalize_currency(user['default_currency'] if user else None)
+        user_currency = get_user_currency(cursor, user_id)
         txn_currency = normalize_currency(currency or user_currency)
         try:
             numeric_amount = float(amount)
@@ -1646,23 +2360,35 @@ def transactions():
             return jsonify({'success': False, 'message': 'Kwota musi być liczbą.'}), 400
         converted_amount = convert_to_base(numeric_amount, txn_currency)
 
-        cursor.execute(
-            'INSERT INTO transactions (user_id, category_id, type, amount, currency, converted_amount, note, kind, budget_id, occurred_on) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
-            (
-                user_id,
-                category_id,
-                txn_type,
-                numeric_amount,
-                txn_currency,
-                converted_amount,
-                note,
-                kind,
-                budget_id,
-                occurred_on,
-            ),
-        )
-        transaction_id = cursor.lastrowid
-        conn.commit()
+        owned_category_id = category_id or None
+        with conn:
+            cursor.execute(
+                SQL_INSERT_TRANSACTION,
+                (
+                    user_id,
+                    category_id,
+                    txn_type,
+                    numeric_amount,
+                    txn_currency,
+                    converted_amount,
+                    note,
+                    kind,
+                    budget_id,
+                    occurred_on,
+                    owned_category_id,
+                    owned_category_id,
+                    user_id,
+                    budget_id,
+                    budget_id,
+                    user_id,
+                ),
+            )
+        if cursor.rowcount != 1:
+            if owned_category_id is not None:
+                cursor.execute(SQL_GET_OWNED_CATEGORY_ID, (owned_category_id, user_id))
+                if cursor.fetchone() is None:
+                    return jsonify({'success': False, 'message': 'Wybrana kategoria nie istnieje.'}), 404
+            return jsonify({'success': False, 'message': 'Wybrany budżet nie istnieje.'}), 404
 
     return jsonify({'success': True, 'message': 'Transakcja dodana.'})
 
@@ -1673,28 +2399,37 @@ def transaction_detail(transaction_id: int):
     """Aktualizuje albo usuwa wskazaną transakcję po dodatkowych walidacjach."""
     if request.method == 'DELETE':
         target_email = request.args.get('email', '').strip().lower() or None
-        with closing(get_db_connection()) as conn:
+        with db_connection() as conn:
             cursor = conn.cursor()
             user_id = resolve_user_id(cursor, target_email)
             if not user_id:
                 return jsonify({'success': False, 'message': 'Brak uprawnień lub użytkownik nie istnieje.'}), 403
-            cursor.execute('DELETE FROM transactions WHERE id = ? AND user_id = ?', (transaction_id, user_id))
-            if cursor.rowcount == 0:
-                return jsonify({'success': False, 'message': 'Nie znaleziono transakcji.'}), 404
-            conn.commit()
+            with conn:
+                cursor.execute('DELETE FROM transactions WHERE id = ? AND user_id = ?', (transaction_id, user_id))
+                if cursor.rowcount == 0:
+                    return jsonify({'success': False, 'message': 'Nie znaleziono transakcji.'}), 404
         return jsonify({'success': True, 'message': 'Transakcja usunięta.'})
 
     data = request.get_json(silent=True) or {}
     target_email = data.get('email', '').strip().lower() or None
 
-    user_id: Optional[int] = None
-    with closing(get_db_connection()) as conn:
+    with db_connection() as conn:
         cursor = conn.cursor()
         user_id = resolve_user_id(cursor, target_email)
         if not user_id:
             return jsonify({'success': False, 'message': 'Brak uprawnień lub użytkownik nie istnieje.'}), 403
 
-        cursor.execute('SELECT * FROM transactions WHERE id = ? AND user_id = ?', (transaction_id, user_id))
+        category_value = data.get('category_id') or None
+        budget_value: Optional[int] = None
+        budget_invalid = False
+        if data.get('budget_id') not in (None, ''):
+            budget_value = _parse_int(data.get('budget_id'))
+            budget_invalid = budget_value is None
+            if budget_value is not None and budget_value <= 0:
+                budget_value = None
+
+        # Jeden odczyt zwraca stan transakcji, walutę użytkownika i przynależność nowej kategorii oraz budżetu.
+        cursor.execute(SQL_GET_TRANSACTION_EDIT_STATE, (category_value, budget_value, transaction_id, user_id))
         existing = cursor.fetchone()
         if not existing:
             return jsonify({'success': False, 'message': 'Nie znaleziono transakcji.'}), 404
@@ -1702,29 +2437,17 @@ def transaction_detail(transaction_id: int):
         updates: Dict[str, Any] = {}
         if data.get('category_id') is not None:
             updates['category_id'] = data.get('category_id')
-            if updates['category_id']:
-                cursor.execute('SELECT id FROM categories WHERE id = ? AND user_id = ?', (updates['category_id'], user_id))
-                if not cursor.fetchone():
-                    return jsonify({'success': False, 'message': 'Wybrana kategoria nie istnieje.'}), 404
+            if updates['category_id'] and not existing['category_owned']:
+                return jsonify({'success': False, 'message': 'Wybrana kategoria nie istnieje.'}), 404
         if 'budget_id' in data:
-            raw_budget_id = data.get('budget_id')
-            if raw_budget_id in (None, ''):
-                updates['budget_id'] = None
-            else:
-                try:
-                    budget_value = int(raw_budget_id)
-                except (TypeError, ValueError):
-                    return jsonify({'success': False, 'message': 'Niepoprawny identyfikator budżetu.'}), 400
-                if budget_value <= 0:
-                    updates['budget_id'] = None
-                else:
-                    cursor.execute('SELECT id FROM budgets WHERE id = ? AND user_id = ?', (budget_value, user_id))
-                    if not cursor.fetchone():
-                        return jsonify({'success': False, 'message': 'Wybrany budżet nie istnieje.'}), 404
-                    updates['budget_id'] = budget_value
+            if budget_invalid:
+                return jsonify({'success': False, 'message': 'Niepoprawny identyfikator budżetu.'}), 400
+            if budget_value is not None and not existing['budget_owned']:
+                return jsonify({'success': False, 'message': 'Wybrany budżet nie istnieje.'}), 404
+            updates['budget_id'] = budget_value
         if data.get('type') is not None:
             new_type = (data.get('type') or '').strip().lower()
-            if new_type not in {'income', 'expense', 'transfer'}:
+            if new_type not in TRANSACTION_TYPES:
                 return jsonify({'success': False, 'message': 'Niepoprawny typ transakcji.'}), 400
             updates['type'] = new_type
         if data.get('kind') is not None:
@@ -1744,8 +2467,7 @@ def transaction_detail(transaction_id: int):
         if data.get('occurred_on') is not None:
             updates['occurred_on'] = parse_iso_date(data.get('occurred_on'))
 
-        user = get_user_by_id(cursor, user_id)
-        user_currency = normalize_currency(user['default_currency'] if user else None)
+        user_currency = normalize_currency(existing['default_currency'])
 
         amount_value = updates.get('amount', existing['amount'])
         currency_value = updates.get('currency', existing['currency'] or user_currency)
@@ -1765,16 +2487,16 @@ def transaction_detail(transaction_id: int):
         if not updates:
             return jsonify({'success': False, 'message': 'Brak danych do aktualizacji.'}), 400
 
-        set_parts = [f"{key} = ?" for key in updates.keys()]
-        params = list(updates.values())
-        set_clause = ', '.join(set_parts + ['updated_at = CURRENT_TIMESTAMP'])
+        mask = 0
+        params: list[Any] = []
+        for bit, column in enumerate(TRANSACTION_UPDATE_COLUMNS):
+            if column in updates:
+                mask |= 1 << bit
+                params.append(updates[column])
 
         params.extend([transaction_id, user_id])
-        cursor.execute(
-            f"UPDATE transactions SET {set_clause} WHERE id = ? AND user_id = ?",
-            params,
-        )
-        conn.commit()
+        with conn:
+            cursor.execute(SQL_UPDATE_TRANSACTION[mask], params)
 
     return jsonify({'success': True, 'message': 'Transakcja zaktualizowana.'})
 
@@ -1787,76 +2509,47 @@ def budgets():
         if not email:
             return jsonify({'success': False, 'message': 'Brak adresu e-mail.'}), 400
 
-        with closing(get_db_connection()) as conn:
+        with db_connection() as conn:
             cursor = conn.cursor()
             user_id = resolve_user_id(cursor, email)
             if not user_id:
                 return jsonify({'success': False, 'message': 'Nie znaleziono użytkownika.'}), 404
-        process_recurring_transactions(user_id)
 
-        with closing(get_db_connection()) as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT * FROM budgets WHERE user_id = ? ORDER BY created_at DESC', (user_id,))
-            raw_budgets = [dict(row) for row in cursor.fetchall()]
+            process_recurring_transactions(user_id, conn)
+            user_currency = get_user_currency(cursor, user_id)
 
-            user = get_user_by_id(cursor, user_id)
-            user_currency = normalize_currency(user['default_currency'] if user else None)
+        with db_connection(readonly=True) as read_conn:
+            raw_budgets = fetch_dicts(read_conn, SQL_LIST_BUDGETS, (user_id,), BUDGET_FIELDS)
 
-            month_start = date.today().replace(day=1)
-            month_end = end_of_month(date.today())
+            today = date.today()
+            month_start = today.replace(day=1)
+            month_end = end_of_month(today)
 
+            display_divisor = base_rate_divisor(user_currency)
+            base_rates: Dict[str, float] = {}
+            spending: Dict[int, List[float]] = {}
+            cursor = read_conn.cursor()
             cursor.execute(
-                'SELECT id, budget_id, category_id, amount, currency, occurred_on '
-                'FROM transactions WHERE user_id = ? AND type = ?',
-                (user_id, 'expense'),
+                SQL_BUDGET_SPENDING,
+                (month_start.isoformat(), month_end.isoformat(), user_id, user_id, 'expense'),
             )
-            raw_transactions = [dict(row) for row in cursor.fetchall()]
-
-            transactions = []
-            for txn in raw_transactions:
-                occurred_raw = (txn.get('occurred_on') or '')[:10]
-                try:
-                    occurred_date = datetime.fromisoformat(occurred_raw).date()
-                except ValueError:
-                    continue
-                amount_pln = convert_to_base(
-                    float(txn.get('amount') or 0),
-                    txn.get('currency') or BASE_CURRENCY,
-                )
-                transactions.append({
-                    'budget_id': txn.get('budget_id'),
-                    'category_id': txn.get('category_id'),
-                    'occurred_on': occurred_date,
-                    'amount_pln': amount_pln,
-                })
-
+            for row in cursor.fetchall():
+                currency = normalize_currency(row['currency'] or BASE_CURRENCY)
+                rate = base_rates.get(currency)
+                if rate is None:
+                    rate = base_rates[currency] = get_exchange_rate(currency)
+                totals = spending.setdefault(row['budget_id'], [0.0, 0, 0.0, 0])
+                totals[0] += row['direct_amount'] * rate
+                totals[1] += row['direct_count']
+                totals[2] += row['fallback_amount'] * rate
+                totals[3] += row['fallback_count']
+
+            limits_pln: List[float] = []
+            spent_totals_pln: List[float] = []
             for budget in raw_budgets:
-                start_str = budget['start_date'] or month_start.isoformat()
-                end_str = budget['end_date'] or month_end.isoformat()
-                try:
-                    start_date = datetime.fromisoformat(start_str).date()
-                except ValueError:
-                    start_date = month_start
-                try:
-                    end_date = datetime.fromisoformat(end_str).date()
-                except ValueError:
-                    end_date = month_end
-
-                spent_pln = 0.0
-                total_transactions = 0
-                fallback_spent_pln = 0.0
-                fallback_total = 0
-
-                for txn in transactions:
-                    if txn['occurred_on'] < start_date or txn['occurred_on'] > end_date:
-                        continue
-                    if txn['budget_id'] == budget['id']:
-                        spent_pln += txn['amount_pln']
-                        total_transactions += 1
-                    elif budget['category_id'] and txn['budget_id'] is None and txn['category_id'] == budget['category_id']:
-                        fallback_spent_pln += txn['amount_pln']
-                        fallback_total += 1
-
+                spent_pln, total_transactions, fallback_spent_pln, fallback_total = spending.get(
+                    budget['id'], (0.0, 0, 0.0, 0)
+                )
                 if (spent_pln == 0) and budget['category_id']:
                     spent_pln = fallback_spent_pln
                     total_transactions = fallback_total
@@ -1864,15 +2557,11 @@ def budgets():
                 budget['budget_type'] = budget.get('budget_type') or DEFAULT_BUDGET_TYPE
                 limit_pln = float(budget.get('limit_amount') or 0)
 
-                notify_payload = {
-                    **budget,
-                    'limit_amount': limit_pln,
-                    'spent_amount': spent_pln,
-                }
-                maybe_send_budget_notification(conn, cursor, notify_payload)
+                limits_pln.append(limit_pln)
+                spent_totals_pln.append(spent_pln)
 
-                limit_display = convert_from_base(limit_pln, user_currency)
-                spent_display = convert_from_base(spent_pln, user_currency)
+                limit_display = limit_pln / display_divisor
+                spent_display = spent_pln / display_divisor
 
                 budget['limit_amount'] = limit_display
                 budget['spent_amount'] = spent_display
@@ -1884,7 +2573,18 @@ def budgets():
                 else:
                     budget['utilization'] = None
 
-            return jsonify({'success': True, 'budgets': raw_budgets})
+            alert_mask = budget_alert_mask(limits_pln, spent_totals_pln, BUDGET_ALERT_THRESHOLD)
+            schedule_budget_notifications([
+                {
+                    'id': budget['id'],
+                    'name': budget['name'],
+                    'limit_amount': limit_pln,
+                    'spent_amount': spent_pln,
+                }
+                for budget, limit_pln, spent_pln, alert in zip(raw_budgets, limits_pln, spent_totals_pln, alert_mask)
+                if alert
+            ])
+            return _json({'success': True, 'budgets': raw_budgets})
 
     data = request.get_json(silent=True) or {}
     email = data.get('email', '').strip().lower()
@@ -1896,40 +2596,38 @@ def budgets():
 
     if not email or not name or limit_amount is None:
         return jsonify({'success': False, 'message': 'Brak wymaganych danych.'}), 400
-    if period not in {'weekly', 'monthly', 'quarterly', 'custom'}:
+    if period not in BUDGET_PERIODS:
         return jsonify({'success': False, 'message': 'Niepoprawny okres budżetu.'}), 400
     if not budget_type:
         budget_type = DEFAULT_BUDGET_TYPE
 
-    with closing(get_db_connection()) as conn:
+    with db_connection() as conn:
         cursor = conn.cursor()
         user_id = resolve_user_id(cursor, email)
         if not user_id:
             return jsonify({'success': False, 'message': 'Nie znaleziono użytkownika.'}), 404
 
-        user = get_user_by_id(cursor, user_id)
-        input_currency = normalize_currency(data.get('currency') or (user['default_currency'] if user else None))
+        input_currency = normalize_currency(data.get('currency') or get_user_currency(cursor, user_id))
         try:
             limit_amount_value = float(limit_amount)
         except (TypeError, ValueError):
             return jsonify({'success': False, 'message': 'Limit budżetu musi być liczbą.'}), 400
         limit_amount_base = convert_to_base(limit_amount_value, input_currency)
 
-        cursor.execute(
-            'INSERT INTO budgets (user_id, category_id, name, limit_amount, period, budget_type, start_date, end_date) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
-            (
-                user_id,
-                data.get('category_id'),
-                name,
-                limit_amount_base,
-                period,
-                budget_type,
-                data.get('start_date'),
-                data.get('end_date'),
-            ),
-        )
-        cursor.lastrowid
-        conn.commit()
+        with conn:
+            cursor.execute(
+                'INSERT INTO budgets (user_id, category_id, name, limit_amount, period, budget_type, start_date, end_date) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (
+                    user_id,
+                    data.get('category_id'),
+                    name,
+                    limit_amount_base,
+                    period,
+                    budget_type,
+                    data.get('start_date'),
+                    data.get('end_date'),
+                ),
+            )
 
     return jsonify({'success': True, 'message': 'Budżet dodany.'})
 
@@ -1941,15 +2639,15 @@ def budget_detail(budget_id):
         email = request.args.get('email', '').strip().lower()
         if not email:
             return jsonify({'success': False, 'message': 'Brak adresu e-mail.'}), 400
-        with closing(get_db_connection()) as conn:
+        with db_connection() as conn:
             cursor = conn.cursor()
             user_id = resolve_user_id(cursor, email)
             if not user_id:
                 return jsonify({'success': False, 'message': 'Nie znaleziono użytkownika.'}), 404
-            cursor.execute('DELETE FROM budgets WHERE id = ? AND user_id = ?', (budget_id, user_id))
-            if cursor.rowcount == 0:
-                return jsonify({'success': False, 'message': 'Nie znaleziono budżetu.'}), 404
-            conn.commit()
+            with conn:
+                cursor.execute('DELETE FROM budgets WHERE id = ? AND user_id = ?', (budget_id, user_id))
+                if cursor.rowcount == 0:
+                    return jsonify({'success': False, 'message': 'Nie znaleziono budżetu.'}), 404
         return jsonify({'success': True, 'message': 'Budżet usunięty.'})
 
     data = request.get_json(silent=True) or {}
@@ -1960,7 +2658,7 @@ def budget_detail(budget_id):
     updates = {
         'name': (data.get('name') or '').strip() or None,
         'limit_amount': data.get('limit_amount'),
-        'period': data['period'] if data.get('period') in {'weekly', 'monthly', 'quarterly', 'custom'} else None,
+        'period': data['period'] if data.get('period') in BUDGET_PERIODS else None,
         'category_id': data.get('category_id'),
         'start_date': data.get('start_date'),
         'end_date': data.get('end_date'),
@@ -1970,15 +2668,14 @@ def budget_detail(budget_id):
         updates['budget_type'] = normalized_type or DEFAULT_BUDGET_TYPE
 
     user_id = None
-    with closing(get_db_connection()) as conn:
+    with db_connection() as conn:
         cursor = conn.cursor()
         user_id = resolve_user_id(cursor, email)
         if not user_id:
             return jsonify({'success': False, 'message': 'Nie znaleziono użytkownika.'}), 404
 
         if updates.get('limit_amount') is not None:
-            user = get_user_by_id(cursor, user_id)
-            input_currency = normalize_currency(data.get('currency') or (user['default_currency'] if user else None))
+            input_currency = normalize_currency(data.get('currency') or get_user_currency(cursor, user_id))
             try:
                 updates['limit_amount'] = convert_to_base(float(updates['limit_amount']), input_currency)
             except (TypeError, ValueError):
@@ -1994,13 +2691,13 @@ def budget_detail(budget_id):
             return jsonify({'success': False, 'message': 'Brak danych do aktualizacji.'}), 400
 
         params.extend([budget_id, user_id])
-        cursor.execute(
-            f"UPDATE budgets SET {', '.join(set_parts)} WHERE id = ? AND user_id = ?",
-            params,
-        )
-        if cursor.rowcount == 0:
-            return jsonify({'success': False, 'message': 'Nie znaleziono budżetu.'}), 404
-        conn.commit()
+        with conn:
+            cursor.execute(
+                f"UPDATE budgets SET {', '.join(set_parts)} WHERE id = ? AND user_id = ?",
+                params,
+            )
+            if cursor.rowcount == 0:
+                return jsonify({'success': False, 'message': 'Nie znaleziono budżetu.'}), 404
 
     return jsonify({'success': True, 'message': 'Budżet zaktualizowany.'})
 
@@ -2013,30 +2710,26 @@ def savings_goals():
         if not email:
             return jsonify({'success': False, 'message': 'Brak adresu e-mail.'}), 400
 
-        with closing(get_db_connection()) as conn:
+        with db_connection(readonly=True) as conn:
             cursor = conn.cursor()
             user_id = resolve_user_id(cursor, email)
             if not user_id:
                 return jsonify({'success': False, 'message': 'Nie znaleziono użytkownika.'}), 404
 
-            user = get_user_by_id(cursor, user_id)
-            user_currency = normalize_currency(user['default_currency'] if user else None)
+            user_currency = get_user_currency(cursor, user_id)
 
-            cursor.execute('SELECT * FROM savings_goals WHERE user_id = ? ORDER BY created_at DESC', (user_id,))
+            display_divisor = base_rate_divisor(user_currency)
+            cursor.execute(SQL_LIST_SAVINGS_GOALS, (user_id,))
             goals = []
             for row in cursor.fetchall():
                 goal = dict(row)
-                cursor.execute(
-                    'SELECT COALESCE(SUM(amount), 0) AS total FROM savings_goal_contributions WHERE goal_id = ?',
-                    (goal['id'],),
-                )
-                contributed_pln = cursor.fetchone()['total']
+                contributed_pln = goal.pop('contributed_total')
                 target_pln = float(goal.get('target_amount') or 0)
                 current_pln = float(goal.get('current_amount') or 0)
 
-                goal['contributed_amount'] = convert_from_base(contributed_pln, user_currency)
-                goal['target_amount'] = convert_from_base(target_pln, user_currency)
-                goal['current_amount'] = convert_from_base(current_pln, user_currency)
+                goal['contributed_amount'] = float(contributed_pln) / display_divisor
+                goal['target_amount'] = target_pln / display_divisor
+                goal['current_amount'] = current_pln / display_divisor
                 goal['remaining_amount'] = max(goal['target_amount'] - goal['current_amount'], 0)
                 goal['progress_percent'] = (
                     round((current_pln / target_pln) * 100, 2)
@@ -2045,7 +2738,7 @@ def savings_goals():
                 )
                 goal['currency'] = user_currency
                 goals.append(goal)
-            return jsonify({'success': True, 'goals': goals})
+            return _json({'success': True, 'goals': goals})
 
     data = request.get_json(silent=True) or {}
     email = data.get('email', '').strip().lower()
@@ -2055,34 +2748,32 @@ def savings_goals():
     if not email or not name or target_amount is None:
         return jsonify({'success': False, 'message': 'Brak wymaganych danych.'}), 400
 
-    with closing(get_db_connection()) as conn:
+    with db_connection() as conn:
         cursor = conn.cursor()
         user_id = resolve_user_id(cursor, email)
         if not user_id:
             return jsonify({'success': False, 'message': 'Nie znaleziono użytkownika.'}), 404
 
-        user = get_user_by_id(cursor, user_id)
-        input_currency = normalize_currency(data.get('currency') or (user['default_currency'] if user else None))
+        input_currency = normalize_currency(data.get('currency') or get_user_currency(cursor, user_id))
         try:
             target_pln = convert_to_base(float(target_amount), input_currency)
             current_pln = convert_to_base(float(data.get('current_amount', 0) or 0), input_currency)
         except (TypeError, ValueError):
             return jsonify({'success': False, 'message': 'Niepoprawna kwota celu.'}), 400
 
-        cursor.execute(
-            'INSERT INTO savings_goals (user_id, name, target_amount, current_amount, deadline, category_id, is_active) VALUES (?, ?, ?, ?, ?, ?, ?)',
-            (
-                user_id,
-                name,
-                target_pln,
-                current_pln,
-                data.get('deadline'),
-                data.get('category_id'),
-                1 if data.get('is_active', True) else 0,
-            ),
-        )
-        goal_id = cursor.lastrowid
-        conn.commit()
+        with conn:
+            cursor.execute(
+                SQL_INSERT_SAVINGS_GOAL,
+                (
+                    user_id,
+                    name,
+                    target_pln,
+                    current_pln,
+                    data.get('deadline'),
+                    data.get('category_id'),
+                    1 if data.get('is_active', True) else 0,
+                ),
+            )
 
     return jsonify({'success': True, 'message': 'Cel oszczędnościowy dodany.'})
 
@@ -2097,17 +2788,17 @@ def savings_goal_detail(goal_id):
 
     updated_goal = None
     user_id = None
-    with closing(get_db_connection()) as conn:
+    with db_connection() as conn:
         cursor = conn.cursor()
         user_id = resolve_user_id(cursor, email)
         if not user_id:
             return jsonify({'success': False, 'message': 'Nie znaleziono użytkownika.'}), 404
 
         if request.method == 'DELETE':
-            cursor.execute('DELETE FROM savings_goals WHERE id = ? AND user_id = ?', (goal_id, user_id))
-            if cursor.rowcount == 0:
-                return jsonify({'success': False, 'message': 'Nie znaleziono celu.'}), 404
-            conn.commit()
+            with conn:
+                cursor.execute(SQL_DELETE_SAVINGS_GOAL, (goal_id, user_id))
+                if cursor.rowcount == 0:
+                    return jsonify({'success': False, 'message': 'Nie znaleziono celu.'}), 404
             return jsonify({'success': True, 'message': 'Cel usunięty.'})
 
         updates = {}
@@ -2118,13 +2809,11 @@ def savings_goal_detail(goal_id):
         input_currency = normalize_currency(data.get('currency') or None)
         if data.get('target_amount') is not None:
             if input_currency is None:
-                user = get_user_by_id(cursor, user_id)
-                input_currency = normalize_currency(user['default_currency'] if user else None)
+                input_currency = get_user_currency(cursor, user_id)
             updates['target_amount'] = convert_to_base(float(data.get('target_amount')), input_currency)
         if data.get('current_amount') is not None:
             if input_currency is None:
-                user = get_user_by_id(cursor, user_id)
-                input_currency = normalize_currency(user['default_currency'] if user else None)
+                input_currency = get_user_currency(cursor, user_id)
             updates['current_amount'] = convert_to_base(float(data.get('current_amount')), input_currency)
         if data.get('deadline') is not None:
             updates['deadline'] = data.get('deadline') or None
@@ -2136,20 +2825,18 @@ def savings_goal_detail(goal_id):
         if not updates:
             return jsonify({'success': False, 'message': 'Brak danych do aktualizacji.'}), 400
 
-        set_parts = []
-        params = []
-        for key, value in updates.items():
-            set_parts.append(f"{key} = ?")
-            params.append(value)
+        mask = 0
+        params: list[Any] = []
+        for bit, column in enumerate(SAVINGS_GOAL_UPDATE_COLUMNS):
+            if column in updates:
+                mask |= 1 << bit
+                params.append(updates[column])
 
         params.extend([goal_id, user_id])
-        cursor.execute(
-            f"UPDATE savings_goals SET {', '.join(set_parts)}, updated_at = CURRENT_TIMESTAMP WHERE id = ? AND user_id = ?",
-            params,
-        )
-        if cursor.rowcount == 0:
-            return jsonify({'success': False, 'message': 'Nie znaleziono celu.'}), 404
-        conn.commit()
+        with conn:
+            cursor.execute(SQL_UPDATE_SAVINGS_GOAL[mask], params)
+            if cursor.rowcount == 0:
+                return jsonify({'success': False, 'message': 'Nie znaleziono celu.'}), 404
 
     return jsonify({'success': True, 'message': 'Cel zaktualizowany.'})
 
@@ -2166,31 +2853,46 @@ def savings_goal_contribution(goal_id):
     if float(amount) <= 0:
         return jsonify({'success': False, 'message': 'Kwota musi być dodatnia.'}), 400
 
-    with closing(get_db_connection()) as conn:
+    with db_connection() as conn:
         cursor = conn.cursor()
         user_id = resolve_user_id(cursor, email)
         if not user_id:
             return jsonify({'success': False, 'message': 'Nie znaleziono użytkownika.'}), 404
 
-        cursor.execute('SELECT * FROM savings_goals WHERE id = ? AND user_id = ?', (goal_id, user_id))
-        goal = cursor.fetchone()
-        if not goal:
+        cursor.execute(SQL_GET_OWNED_SAVINGS_GOAL_ID, (goal_id, user_id))
+        if cursor.fetchone() is None:
             return jsonify({'success': False, 'message': 'Nie znaleziono celu.'}), 404
 
-        user = get_user_by_id(cursor, user_id)
-        user_currency = normalize_currency(user['default_currency'] if user else None)
+        user_currency = get_user_currency(cursor, user_id)
         contribution_currency = normalize_currency(currency or user_currency)
         converted_amount = convert_to_base(float(amount), contribution_currency)
 
-        cursor.execute(
-            'INSERT INTO savings_goal_contributions (goal_id, amount, note) VALUES (?, ?, ?)',
-            (goal_id, converted_amount, data.get('note')),
-        )
-        conn.commit()
+        with conn:
+            cursor.execute(SQL_INSERT_SAVINGS_CONTRIBUTION, (goal_id, converted_amount, data.get('note')))
 
     return jsonify({'success': True, 'message': 'Wpłata dodana do celu.'})
 
 
+def dashboard_month_split(start: str, end: str) -> Tuple[str, str, str, str]:
+    """Dzieli zakres dat na pełne miesiące czytane z agregatu i brzegowe dni liczone z transakcji."""
+    if not (ISO_DATE_REGEX.fullmatch(start or '') and ISO_DATE_REGEX.fullmatch(end or '')):
+        return '', '', '', ''
+    try:
+        start_date = date.fromisoformat(start)
+        end_date = date.fromisoformat(end)
+    except ValueError:
+        return '', '', '', ''
+    first_full = start_date if start_date.day == 1 else add_months(start_date.replace(day=1), 1)
+    after_full = end_date.replace(day=1)
+    if end_date == end_of_month(end_date):
+        after_full = add_months(after_full, 1)
+    if first_full >= after_full:
+        # Bez pełnych miesięcy agregat nic nie zwraca, a warunek `occurred_on >= ''` przepuszcza wszystkie dni.
+        return '', '', '', ''
+    last_full = after_full - timedelta(days=1)
+    return first_full.isoformat()[:7], last_full.isoformat()[:7], first_full.isoformat(), after_full.isoformat()
+
+
 @app.route('/dashboard/summary', methods=['GET'])
 def dashboard_summary():
     """Liczy zagregowane dane finansowe na potrzeby pulpitu użytkownika."""
@@ -2204,63 +2906,48 @@ def dashboard_summary():
         start = (today - timedelta(days=today.weekday())).isoformat()
     elif period == 'monthly':
         start = today.replace(day=1).isoformat()
-        end = request.args.get('end_date') or end_of_month(today).isoformat()
+    elif period == 'yearly':
         start = today.replace(month=1, day=1).isoformat()
     else:
         start = request.args.get('start_date') or today.replace(day=1).isoformat()
     end = request.args.get('end_date') or today.isoformat()
 
-    with closing(get_db_connection()) as conn:
+    with db_connection() as conn:
         cursor = conn.cursor()
         user_id = resolve_user_id(cursor, email)
         if not user_id:
             return jsonify({'success': False, 'message': 'Nie znaleziono użytkownika.'}), 404
 
-    process_recurring_transactions(user_id)
-
-    with closing(get_db_connection()) as conn:
-        cursor = conn.cursor()
-        user = get_user_by_id(cursor, user_id)
-        default_currency = normalize_currency(user['default_currency'] if user else None)
-
-        cursor.execute(
-            'SELECT COALESCE(SUM(COALESCE(converted_amount, amount)), 0) AS total_income FROM transactions WHERE user_id = ? AND type = ? AND occurred_on BETWEEN ? AND ?',
-            (user_id, 'income', start, end),
-        )
-        total_income_base = cursor.fetchone()['total_income']
+        process_recurring_transactions(user_id, conn)
+        default_currency = get_user_currency(cursor, user_id)
+        display_divisor = base_rate_divisor(default_currency)
 
-        cursor.execute(
-            'SELECT COALESCE(SUM(COALESCE(converted_amount, amount)), 0) AS total_expense FROM transactions WHERE user_id = ? AND type = ? AND occurred_on BETWEEN ? AND ?',
-            (user_id, 'expense', start, end),
-        )
-        total_expense_base = cursor.fetchone()['total_expense']
+        month_from, month_to, live_before, live_from = dashboard_month_split(start, end)
+        source_params = (user_id, month_from, month_to, user_id, start, end, live_before, live_from)
+        cursor.execute(SQL_DASHBOARD_TOTALS, source_params)
+        total_income_base, total_expense_base = cursor.fetchone()
 
-        cursor.execute(
-            'SELECT c.name, COALESCE(SUM(COALESCE(t.converted_amount, t.amount)), 0) AS spent FROM transactions t LEFT JOIN categories c ON t.category_id = c.id '
-            'WHERE t.user_id = ? AND t.type = ? AND t.occurred_on BETWEEN ? AND ? '
-            'GROUP BY c.name ORDER BY spent DESC LIMIT 5',
-            (user_id, 'expense', start, end),
-        )
-        top_categories = []
-        for row in cursor.fetchall():
-            entry = dict(row)
-            entry['spent'] = convert_from_base(entry.get('spent') or 0, default_currency)
-            top_categories.append(entry)
+        cursor.row_factory = None
+        cursor.execute(SQL_DASHBOARD_TOP_CATEGORIES, source_params + ('expense',))
+        top_categories = [
+            {'name': name, 'spent': (spent or 0) / display_divisor}
+            for name, spent in cursor
+        ]
 
         cursor.execute(
             'SELECT limit_amount FROM budgets WHERE user_id = ? ORDER BY created_at DESC LIMIT 3',
             (user_id,),
         )
-        recent_limits = [convert_from_base(row['limit_amount'], default_currency) for row in cursor.fetchall()]
+        recent_limits = [(limit_amount or 0) / display_divisor for limit_amount, in cursor]
 
-    return jsonify({
+    return _json({
         'success': True,
         'summary': {
             'period_start': start,
             'period_end': end,
-            'total_income': convert_from_base(total_income_base, default_currency),
-            'total_expense': convert_from_base(total_expense_base, default_currency),
-            'net_savings': convert_from_base(total_income_base - total_expense_base, default_currency),
+            'total_income': total_income_base / display_divisor,
+            'total_expense': total_expense_base / display_divisor,
+            'net_savings': (total_income_base - total_expense_base) / display_divisor,
             'top_expense_categories': top_categories,
             'recent_budget_limits': recent_limits,
             'currency': default_currency,
@@ -2268,6 +2955,58 @@ def dashboard_summary():
     })
 
 
+def stream_rows(conn: sqlite3.Connection, sql: str, params: Any, arraysize: int = EXPORT_FETCH_BATCH) -> Iterator[sqlite3.Row]:
+    """Zwraca kolejne wiersze zapytania, pobierając je z bazy partiami o stałym rozmiarze."""
+    cursor = conn.cursor()
+    cursor.arraysize = arraysize
+    cursor.execute(sql, params)
+    while True:
+        rows = cursor.fetchmany()
+        if not rows:
+            return
+        yield from rows
+
+
+@contextmanager
+def read_snapshot(conn: sqlite3.Connection) -> Iterator[sqlite3.Connection]:
+    """Otwiera transakcję odczytu, aby wszystkie zapytania w bloku widziały ten sam stan bazy."""
+    if not conn.in_transaction:
+        conn.execute('BEGIN')
+    try:
+        yield conn
+    finally:
+        conn.rollback()
+
+
+def skip_recurring_requested() -> bool:
+    """Sprawdza, czy eksport poproszono o pominięcie generowania zaległych transakcji cyklicznych."""
+    return request.args.get('skip_recurring', '').strip().lower() in ('1', 'true')
+
+
+def _csv_chunks(rows: Iterator[List[Any]], chunk_size: int = CSV_STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+    """Zapisuje wiersze CSV do bufora i oddaje go w paczkach UTF-8 po przekroczeniu zadanego rozmiaru."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= chunk_size:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def csv_stream_response(rows: Iterator[List[Any]], filename: str):
+    """Zwraca odpowiedź z plikiem CSV wysyłanym paczkami w trakcie generowania."""
+    response = app.response_class(
+        stream_with_context(_csv_chunks(rows)),
+        mimetype='text/csv',
+    )
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    return response
+
+
 @app.route('/reports/export', methods=['GET'])
 def export_reports():
     """Buduje raport CSV z transakcjami w zadanym okresie i zwraca go jako plik."""
@@ -2277,280 +3016,327 @@ def export_reports():
     if not email:
         return jsonify({'success': False, 'message': 'Brak adresu e-mail.'}), 400
 
-    with closing(get_db_connection()) as conn:
+    with db_connection() as conn:
         cursor = conn.cursor()
         user_id = resolve_user_id(cursor, email)
         if not user_id:
             return jsonify({'success': False, 'message': 'Nie znaleziono użytkownika.'}), 404
 
-    process_recurring_transactions(user_id)
-
-    with closing(get_db_connection()) as conn:
-        cursor = conn.cursor()
-        user = get_user_by_id(cursor, user_id)
-        default_currency = normalize_currency(user['default_currency'] if user and user['default_currency'] else None)
-
-        query = (
-            'SELECT t.occurred_on, t.type, t.amount, t.currency, t.converted_amount, t.note, c.name AS category_name '
-            'FROM transactions t LEFT JOIN categories c ON t.category_id = c.id '
-            'WHERE t.user_id = ?'
-        )
-        params = [user_id]
-        if start:
-            query += ' AND t.occurred_on >= ?'
-            params.append(start)
-        if end:
-            query += ' AND t.occurred_on <= ?'
-            params.append(end)
-        query += ' ORDER BY t.occurred_on ASC, t.created_at ASC'
-
-        cursor.execute(query, params)
-        rows = cursor.fetchall()
+        if not skip_recurring_requested():
+            process_recurring_transactions(user_id, conn)
+        default_currency = get_user_currency(cursor, user_id)
+        display_divisor = base_rate_divisor(default_currency)
 
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['Data', 'Typ', 'Kategoria', 'Kwota', 'Waluta', f'Kwota ({default_currency})', 'Notatka'])
-    for row in rows:
-        base_amount = row['converted_amount']
-        if base_amount is None:
-            base_amount = convert_to_base(float(row['amount']), normalize_currency(row['currency'] or default_currency))
-        display_amount = convert_from_base(base_amount, default_currency)
-        writer.writerow([
-            row['occurred_on'],
-            row['type'],
-            row['category_name'] or '-',
-            f"{row['amount']:.2f}",
-            row['currency'] or default_currency,
-            f"{display_amount:.2f}",
-            row['note'] or '',
-        ])
-
-    csv_content = output.getvalue()
-    filename = f"report_{date.today().isoformat()}.csv"
-    response = make_response(csv_content)
-    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
-    response.headers['Content-Type'] = 'text/csv; charset=utf-8'
-    return response
+    query = (
+        "SELECT t.occurred_on, t.type, COALESCE(NULLIF(c.name, ''), '-'), t.amount, "
+        "COALESCE(NULLIF(t.currency, ''), ?), t.converted_amount, COALESCE(t.note, '') "
+        'FROM transactions t LEFT JOIN categories c ON t.category_id = c.id '
+        'WHERE t.user_id = ?'
+    )
+    params = [default_currency, user_id]
+    if start:
+        query += ' AND t.occurred_on >= ?'
+        params.append(start)
+    if end:
+        query += ' AND t.occurred_on <= ?'
+        params.append(end)
+    query += ' ORDER BY t.occurred_on ASC, t.created_at ASC, t.id ASC'
+
+    def report_rows() -> Iterator[List[Any]]:
+        """Generuje kolejne wiersze raportu, czytając transakcje prosto z kursora."""
+        yield ['Data', 'Typ', 'Kategoria', 'Kwota', 'Waluta', f'Kwota ({default_currency})', 'Notatka']
+        with db_connection(readonly=True) as conn:
+            for occurred_on, txn_type, category_name, amount, currency, converted_amount, note in stream_rows(conn, query, params):
+                yield [
+                    occurred_on,
+                    txn_type,
+                    category_name,
+                    f"{amount:.2f}",
+                    currency,
+                    f"{converted_amount / display_divisor:.2f}",
+                    note,
+                ]
+
+    return csv_stream_response(report_rows(), f"report_{date.today().isoformat()}.csv")
+
+
+def full_export_rows(
+    user_id: int,
+    process_recurring: bool = True,
+    fallback_user: Optional[Dict[str, Any]] = None,
+) -> Iterator[List[Any]]:
+    """Przygotowuje pełny eksport użytkownika i zwraca generator jego wierszy CSV, niezależny od żądania."""
+    with db_connection() as conn:
+        if process_recurring:
+            process_recurring_transactions(user_id, conn)
+        user_row = get_user_by_id(conn.cursor(), user_id)
+        user = dict(user_row) if user_row else dict(fallback_user or {})
+        default_currency = normalize_currency(user.get('default_currency'))
+        display_divisor = base_rate_divisor(default_currency)
+
+    def export_rows() -> Iterator[List[Any]]:
+        """Generuje kolejne sekcje eksportu, czytając wszystkie tabele z jednej migawki bazy."""
+        yield ['SEKCJA', 'użytkownik']
+        yield ['email', user.get('email')]
+        yield ['display_name', user.get('display_name') or '']
+        yield ['default_currency', default_currency]
+        monthly_income = user.get('monthly_income')
+        monthly_income_currency = user.get('monthly_income_currency') or default_currency
+        yield [
+            'monthly_income',
+            0 if monthly_income is None else monthly_income,
+        ]
+        yield ['monthly_income_currency', monthly_income_currency]
+        yield ['monthly_income_day', user.get('monthly_income_day') or '']
+        yield []
+
+        with db_connection(readonly=True) as conn, read_snapshot(conn):
+            yield ['SEKCJA', 'kategorie']
+            yield ['id', 'name', 'type', 'color', 'icon_url', 'created_at']
+            for row in stream_rows(conn, SQL_EXPORT_CATEGORIES, (user_id,)):
+                yield [
+                    row['id'],
+                    row['name'],
+                    row['type'],
+                    row['color'] or '',
+                    row['icon_url'] or '',
+                    row['created_at'],
+                ]
+            yield []
+
+            yield ['SEKCJA', 'typy_budzetow']
+            yield ['id', 'name', 'created_at']
+            for row in stream_rows(conn, SQL_EXPORT_BUDGET_TYPES, (user_id,)):
+                yield [row['id'], row['name'], row['created_at']]
+            yield []
+
+            yield ['SEKCJA', 'budzety']
+            yield [
+                'id',
+                'name',
+                'limit_amount',
+                'period',
+                'budget_type',
+                'category_id',
+                'start_date',
+                'end_date',
+                'created_at',
+            ]
+            for row in stream_rows(conn, SQL_EXPORT_BUDGETS, (user_id,)):
+                yield [
+                    row['id'],
+                    row['name'],
+                    (row['limit_amount'] or 0) / display_divisor,
+                    row['period'],
+                    row['budget_type'],
+                    row['category_id'] or '',
+                    row['start_date'] or '',
+                    row['end_date'] or '',
+                    row['created_at'],
+                ]
+            yield []
+
+            yield ['SEKCJA', 'cele_oszczednosciowe']
+            yield [
+                'id',
+                'name',
+                'target_amount',
+                'current_amount',
+                'deadline',
+                'category_id',
+                'is_active',
+                'created_at',
+                'updated_at',
+            ]
+            for row in stream_rows(conn, SQL_EXPORT_SAVINGS_GOALS, (user_id,)):
+                yield [
+                    row['id'],
+                    row['name'],
+                    (row['target_amount'] or 0) / display_divisor,
+                    (row['current_amount'] or 0) / display_divisor,
+                    row['deadline'] or '',
+                    row['category_id'] or '',
+                    row['is_active'],
+                    row['created_at'],
+                    row['updated_at'],
+                ]
+            yield []
+
+            yield ['SEKCJA', 'wplaty_do_celow']
+            yield ['id', 'goal_id', 'amount', 'note', 'created_at']
+            for row in stream_rows(conn, SQL_EXPORT_SAVINGS_CONTRIBUTIONS, (user_id,)):
+                yield [
+                    row['id'],
+                    row['goal_id'],
+                    (row['amount'] or 0) / display_divisor,
+                    row['note'] or '',
+                    row['created_at'],
+                ]
+            yield []
+
+            yield ['SEKCJA', 'transakcje_cykliczne']
+            yield [
+                'id',
+                'category_id',
+                'type',
+                'amount',
+                'currency',
+                'note',
+                'frequency',
+                'start_date',
+                'next_occurrence',
+                'end_date',
+                'last_generated',
+                'created_at',
+            ]
+            for row in stream_rows(conn, SQL_EXPORT_RECURRING_TRANSACTIONS, (user_id,)):
+                yield [
+                    row['id'],
+                    row['category_id'] or '',
+                    row['type'],
+                    row['amount'],
+                    row['currency'] or default_currency,
+                    row['note'] or '',
+                    row['frequency'],
+                    row['start_date'],
+                    row['next_occurrence'],
+                    row['end_date'] or '',
+                    row['last_generated'] or '',
+                    row['created_at'],
+                ]
+            yield []
+
+            yield ['SEKCJA', 'transakcje']
+            yield [
+                'id',
+                'occurred_on',
+                'type',
+                'amount',
+                'currency',
+                f'converted_amount_{default_currency}',
+                'category_id',
+                'category_name',
+                'budget_id',
+                'budget_name',
+                'note',
+                'kind',
+                'created_at',
+            ]
+            # Zastępowanie pustych wartości odbywa się w SQL, więc w Pythonie zostaje tylko formatowanie kwot.
+            for txn_id, occurred_on, txn_type, amount, currency, converted_amount, *rest in stream_rows(
+                conn, SQL_EXPORT_TRANSACTIONS, (default_currency, user_id)
+            ):
+                yield [
+                    txn_id,
+                    occurred_on,
+                    txn_type,
+                    f"{amount:.2f}",
+                    currency,
+                    f"{converted_amount / display_divisor:.2f}",
+                    *rest,
+                ]
+
+    return export_rows()
 
 
 @app.route('/export/all', methods=['GET'])
 @auth_required()
 def export_all_data():
     """Eksportuje wszystkie dane zalogowanego użytkownika do jednego pliku CSV."""
-    user = g.current_user
-    user_id = user['id']
+    rows = full_export_rows(g.current_user['id'], not skip_recurring_requested(), g.current_user)
+    return csv_stream_response(rows, f"savoo_export_{date.today().isoformat()}.csv")
 
-    process_recurring_transactions(user_id)
-
-    with closing(get_db_connection()) as conn:
-        cursor = conn.cursor()
-        user_row = get_user_by_id(cursor, user_id)
-        default_currency = normalize_currency(user_row['default_currency'] if user_row else None)
 
-        cursor.execute('SELECT * FROM categories WHERE user_id = ? ORDER BY created_at ASC', (user_id,))
-        categories = cursor.fetchall()
+def _export_job_path(job_id: str) -> str:
+    """Zwraca ścieżkę pliku CSV należącego do zlecenia eksportu."""
+    return os.path.join(EXPORT_JOBS_DIR, f'{job_id}.csv')
 
-        cursor.execute('SELECT * FROM budget_types WHERE user_id = ? ORDER BY created_at ASC', (user_id,))
-        budget_types = cursor.fetchall()
 
-        cursor.execute('SELECT * FROM budgets WHERE user_id = ? ORDER BY created_at ASC', (user_id,))
-        budgets = cursor.fetchall()
+def _export_job_stale_before() -> str:
+    """Zwraca granicę created_at, przed którą niedokończone zlecenie uznaje się za porzucone."""
+    return (datetime.utcnow() - EXPORT_JOB_TTL).strftime('%Y-%m-%d %H:%M:%S')
 
-        cursor.execute('SELECT * FROM savings_goals WHERE user_id = ? ORDER BY created_at ASC', (user_id,))
-        savings_goals = cursor.fetchall()
 
-        cursor.execute(
-            'SELECT * FROM savings_goal_contributions WHERE goal_id IN '
-            '(SELECT id FROM savings_goals WHERE user_id = ?) ORDER BY created_at ASC',
-            (user_id,),
-        )
-        goal_contributions = cursor.fetchall()
+def _remove_export_file(file_path: str) -> None:
+    """Usuwa plik eksportu, jeśli jeszcze istnieje."""
+    try:
+        os.remove(file_path)
+    except FileNotFoundError:
+        pass
 
-        cursor.execute('SELECT * FROM recurring_transactions WHERE user_id = ? ORDER BY created_at ASC', (user_id,))
-        recurring = cursor.fetchall()
 
-        cursor.execute(
-            'SELECT t.*, c.name AS category_name, b.name AS budget_name '
-            'FROM transactions t '
-            'LEFT JOIN categories c ON t.category_id = c.id '
-            'LEFT JOIN budgets b ON t.budget_id = b.id '
-            'WHERE t.user_id = ? '
-            'ORDER BY t.occurred_on ASC, t.created_at ASC',
-            (user_id,),
-        )
-        transactions = cursor.fetchall()
-
-    output = io.StringIO()
-    writer = csv.writer(output)
-
-    writer.writerow(['SEKCJA', 'użytkownik'])
-    writer.writerow(['email', user.get('email')])
-    writer.writerow(['display_name', user.get('display_name') or ''])
-    writer.writerow(['default_currency', default_currency])
-    monthly_income = user.get('monthly_income')
-    monthly_income_currency = user.get('monthly_income_currency') or default_currency
-    writer.writerow([
-        'monthly_income',
-        0 if monthly_income is None else monthly_income,
-    ])
-    writer.writerow(['monthly_income_currency', monthly_income_currency])
-    writer.writerow(['monthly_income_day', user.get('monthly_income_day') or ''])
-    writer.writerow([])
-
-    writer.writerow(['SEKCJA', 'kategorie'])
-    writer.writerow(['id', 'name', 'type', 'color', 'icon_url', 'created_at'])
-    for row in categories:
-        writer.writerow([
-            row['id'],
-            row['name'],
-            row['type'],
-            row['color'] or '',
-            row['icon_url'] or '',
-            row['created_at'],
-        ])
-    writer.writerow([])
-
-    writer.writerow(['SEKCJA', 'typy_budzetow'])
-    writer.writerow(['id', 'name', 'created_at'])
-    for row in budget_types:
-        writer.writerow([row['id'], row['name'], row['created_at']])
-    writer.writerow([])
-
-    writer.writerow(['SEKCJA', 'budzety'])
-    writer.writerow([
-        'id',
-        'name',
-        'limit_amount',
-        'period',
-        'budget_type',
-        'category_id',
-        'start_date',
-        'end_date',
-        'created_at',
-    ])
-    for row in budgets:
-        writer.writerow([
-            row['id'],
-            row['name'],
-            convert_from_base(row['limit_amount'], default_currency),
-            row['period'],
-            row['budget_type'],
-            row['category_id'] or '',
-            row['start_date'] or '',
-            row['end_date'] or '',
-            row['created_at'],
-        ])
-    writer.writerow([])
-
-    writer.writerow(['SEKCJA', 'cele_oszczednosciowe'])
-    writer.writerow([
-        'id',
-        'name',
-        'target_amount',
-        'current_amount',
-        'deadline',
-        'category_id',
-        'is_active',
-        'created_at',
-        'updated_at',
-    ])
-    for row in savings_goals:
-        writer.writerow([
-            row['id'],
-            row['name'],
-            convert_from_base(row['target_amount'], default_currency),
-            convert_from_base(row['current_amount'], default_currency),
-            row['deadline'] or '',
-            row['category_id'] or '',
-            row['is_active'],
-            row['created_at'],
-            row['updated_at'],
-        ])
-    writer.writerow([])
-
-    writer.writerow(['SEKCJA', 'wplaty_do_celow'])
-    writer.writerow(['id', 'goal_id', 'amount', 'note', 'created_at'])
-    for row in goal_contributions:
-        writer.writerow([
-            row['id'],
-            row['goal_id'],
-            convert_from_base(row['amount'], default_currency),
-            row['note'] or '',
-            row['created_at'],
-        ])
-    writer.writerow([])
-
-    writer.writerow(['SEKCJA', 'transakcje_cykliczne'])
-    writer.writerow([
-        'id',
-        'category_id',
-        'type',
-        'amount',
-        'currency',
-        'note',
-        'frequency',
-        'start_date',
-        'next_occurrence',
-        'end_date',
-        'last_generated',
-        'created_at',
-    ])
-    for row in recurring:
-        writer.writerow([
-            row['id'],
-            row['category_id'] or '',
-            row['type'],
-            row['amount'],
-            row['currency'] or default_currency,
-            row['note'] or '',
-            row['frequency'],
-            row['start_date'],
-            row['next_occurrence'],
-            row['end_date'] or '',
-            row['last_generated'] or '',
-            row['created_at'],
-        ])
-    writer.writerow([])
-
-    writer.writerow(['SEKCJA', 'transakcje'])
-    writer.writerow([
-        'id',
-        'occurred_on',
-        'type',
-        'amount',
-        'currency',
-        f'converted_amount_{default_currency}',
-        'category_id',
-        'category_name',
-        'budget_id',
-        'budget_name',
-        'note',
-        'kind',
-        'created_at',
-    ])
-    for row in transactions:
-        writer.writerow([
-            row['id'],
-            row['occurred_on'],
-            row['type'],
-            f"{row['amount']:.2f}",
-            row['currency'] or default_currency,
-            f"{convert_from_base((row['converted_amount'] if row['converted_amount'] is not None else convert_to_base(float(row['amount']), normalize_currency(row['currency'] or default_currency))), default_currency):.2f}",
-            row['category_id'] or '',
-            row['category_name'] or '',
-            row['budget_id'] or '',
-            row['budget_name'] or '',
-            row['note'] or '',
-            row['kind'] or '',
-            row['created_at'],
-        ])
-
-    csv_content = output.getvalue()
-    filename = f"savoo_export_{date.today().isoformat()}.csv"
-    response = make_response(csv_content)
-    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
-    response.headers['Content-Type'] = 'text/csv; charset=utf-8'
-    return response
+def _run_export_job(job_id: str, user_id: int) -> None:
+    """Zapisuje pełny eksport do pliku w tle i odnotowuje wynik zlecenia na własnym połączeniu."""
+    file_path = _export_job_path(job_id)
+    try:
+        with closing(get_db_connection()) as conn:
+            with conn:
+                conn.execute(SQL_UPDATE_EXPORT_JOB, ('running', None, None, job_id))
+        os.makedirs(EXPORT_JOBS_DIR, exist_ok=True)
+        with open(file_path, 'wb') as handle:
+            for chunk in _csv_chunks(full_export_rows(user_id)):
+                handle.write(chunk)
+        status = 'done'
+    except Exception:
+        logger.exception('Nie udało się przygotować eksportu %s dla użytkownika %s', job_id, user_id)
+        _remove_export_file(file_path)
+        status, file_path = 'failed', None
+    expires_at = (datetime.utcnow() + EXPORT_JOB_TTL).isoformat()
+    with closing(get_db_connection()) as conn:
+        with conn:
+            updated = conn.execute(SQL_UPDATE_EXPORT_JOB, (status, file_path, expires_at, job_id)).rowcount
+    if not updated and file_path:
+        # Zlecenie zostało w międzyczasie usunięte jako porzucone, więc nikt już nie odbierze pliku.
+        _remove_export_file(file_path)
+
+
+def _purge_expired_export_jobs(conn: sqlite3.Connection, user_id: int) -> None:
+    """Usuwa przeterminowane i porzucone zlecenia eksportu użytkownika razem z ich plikami."""
+    expired = conn.execute(
+        SQL_LIST_EXPIRED_EXPORT_JOBS, (user_id, datetime.utcnow().isoformat(), _export_job_stale_before())
+    ).fetchall()
+    for job in expired:
+        # Ścieżka wynika z identyfikatora, więc obejmuje też niedokończone pliki zleceń przerwanych restartem.
+        _remove_export_file(_export_job_path(job['id']))
+    if expired:
+        with conn:
+            conn.executemany(SQL_DELETE_EXPORT_JOB, [(job['id'],) for job in expired])
+
+
+@app.route('/export/all', methods=['POST'])
+@auth_required()
+def queue_full_export():
+    """Zleca przygotowanie pełnego eksportu w tle i zwraca identyfikator zlecenia do odpytywania."""
+    user_id = g.current_user['id']
+    job_id = secrets.token_urlsafe(16)
+    with db_connection() as conn:
+        _purge_expired_export_jobs(conn, user_id)
+        with conn:
+            conn.execute(SQL_INSERT_EXPORT_JOB, (job_id, user_id))
+    _EXPORT_JOB_EXECUTOR.submit(_run_export_job, job_id, user_id)
+    return jsonify({'success': True, 'job_id': job_id, 'status': 'pending'}), 202
+
+
+@app.route('/export/all/<job_id>', methods=['GET'])
+@auth_required()
+def full_export_job(job_id):
+    """Zwraca stan zlecenia eksportu, a po jego zakończeniu gotowy plik CSV."""
+    with db_connection(readonly=True) as conn:
+        job = conn.execute(SQL_GET_EXPORT_JOB, (job_id, g.current_user['id'])).fetchone()
+    if job is None:
+        return jsonify({'success': False, 'message': 'Nie znaleziono zlecenia eksportu.'}), 404
+    if job['status'] in ('pending', 'running') and job['created_at'] >= _export_job_stale_before():
+        return jsonify({'success': True, 'job_id': job_id, 'status': job['status']}), 202
+    if job['status'] != 'done':
+        return jsonify({'success': False, 'message': 'Nie udało się przygotować eksportu.'}), 500
+    if job['expires_at'] < datetime.utcnow().isoformat() or not os.path.exists(job['file_path']):
+        return jsonify({'success': False, 'message': 'Plik eksportu wygasł. Zleć go ponownie.'}), 410
+    return send_file(
+        job['file_path'],
+        mimetype='text/csv',
+        as_attachment=True,
+        download_name=f"savoo_export_{(job['created_at'] or '')[:10] or date.today().isoformat()}.csv",
+    )
 
 
 if __name__ == '__main__':
@@ -1,42 +1,47 @@
 """Jednorazowo dosiewa domyślne kategorie dla istniejących użytkowników."""
+import sqlite3
 from contextlib import closing
-from typing import List
+from typing import Dict, List
 
 import savoo_api
 
 
-def _collect_user_ids() -> List[int]:
+def _collect_user_ids(conn: sqlite3.Connection) -> List[int]:
     """Zwraca listę identyfikatorów wszystkich użytkowników zapisanych w bazie."""
-    with closing(savoo_api.get_db_connection()) as conn:
-        cursor = conn.cursor()
-        cursor.execute('SELECT id FROM users ORDER BY id ASC')
-        return [row['id'] for row in cursor.fetchall()]
+    cursor = conn.cursor()
+    cursor.execute('SELECT id FROM users ORDER BY id ASC')
+    return [row['id'] for row in cursor.fetchall()]
 
 
 def seed_all_users() -> None:
     """Dla każdego użytkownika w bazie wywołuje funkcje dosiewające dane startowe."""
     savoo_api.init_db()
     savoo_api.migrate_db()
-    user_ids = _collect_user_ids()
-    if not user_ids:
-        print('Brak użytkowników do aktualizacji.')
-        return
-
-    total_categories = 0
-    for user_id in user_ids:
-        before_categories = _count_categories(user_id)
-        savoo_api.seed_default_categories(user_id)
-        total_categories += _count_categories(user_id) - before_categories
+    with closing(savoo_api.get_db_connection()) as conn:
+        user_ids = _collect_user_ids(conn)
+        if not user_ids:
+            print('Brak użytkowników do aktualizacji.')
+            return
+
+        before_categories = _count_categories(conn)
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            for user_id in user_ids:
+                savoo_api.seed_default_categories(user_id, conn)
+        after_categories = _count_categories(conn)
+
+    total_categories = sum(
+        after_categories.get(user_id, 0) - before_categories.get(user_id, 0) for user_id in user_ids
+    )
 
     print(f'Zaktualizowano {len(user_ids)} kont. Dodano {total_categories} kategorii.')
 
 
-def _count_categories(user_id: int) -> int:
-    """Pomocniczo zlicza kategorie należące do wskazanego użytkownika."""
-    with closing(savoo_api.get_db_connection()) as conn:
-        cursor = conn.cursor()
-        cursor.execute('SELECT COUNT(*) AS total FROM categories WHERE user_id = ?', (user_id,))
-        return cursor.fetchone()['total']
+def _count_categories(conn: sqlite3.Connection) -> Dict[int, int]:
+    """Pomocniczo zlicza jednym zapytaniem kategorie każdego użytkownika."""
+    cursor = conn.cursor()
+    cursor.execute('SELECT user_id, COUNT(*) AS total FROM categories GROUP BY user_id')
+    return {row['user_id']: row['total'] for row in cursor}
 
 
 if __name__ == '__main__':
@@ -254,9 +254,10 @@ class SavooApiClient {
   }
 
   /// Ściąga listę kategorii wydatków/przychodów.
+  /// Parametr `wait` każe serwerowi poczekać na zasiew kategorii nowego konta.
   Future<List<Map<String, dynamic>>> fetchCategories() async {
     final response = await _client.get(
-      _buildUri('/categories'),
+      _buildUri('/categories', queryParameters: {'wait': '1'}),
       headers: _headers(),
     );
     final data = _decodeResponse(response);